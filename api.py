@@ -1,24 +1,57 @@
-from fastapi import FastAPI, Form, UploadFile, File, Form
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, Form, UploadFile, File, Form, HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse, Response
 from typing import Optional
 from pydantic import BaseModel
-import requests as httpx
 import tempfile
 from pathlib import Path
 from docx import Document  # Для .docx
 import uuid
+import json
+import asyncio
 import re
 import subprocess
-from search_and_respond import extract_text_from_pdf, query_openai, search_by_title_summary, generate_answer
-from utils import save_html_to_pdf, save_to_docx
+from search_and_respond import (extract_text_from_pdf, query_openai_async, search_hybrid, generate_answer_async,
+                                 build_answer_prompt, stream_chat_completion, warm_up)
+from utils import save_html_to_pdf, save_to_docx, render_pdf_bytes, render_docx_bytes
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
-from uuid import uuid4
-from bs4 import BeautifulSoup
 from kazakh_translator import translate_kazakh_to_russian
+from html_translator import translate_html as translate_html_segments
+from executors import create_http_client, run_io, run_model, run_render, shutdown_pools
+from render_jobs import render_jobs
+from memory_artifacts import memory_artifacts
+from uploads import UploadError, download_to_file, save_upload
+from artifact_store import GC_INTERVAL_MINUTES, artifact_name, collect_garbage, disk_usage
 
 app = FastAPI()
 
+# Общий асинхронный HTTP-клиент: скачивание не блокирует цикл событий, соединения переиспользуются
+http_client = create_http_client()
+
+async def gc_loop():
+    # Периодическая очистка answers/, requests/, temp/ по сроку хранения и размеру
+    while True:
+        try:
+            await run_io(collect_garbage)
+        except Exception as e:
+            print(f"⚠️ Ошибка очистки артефактов: {e}")
+        await asyncio.sleep(GC_INTERVAL_MINUTES * 60)
+
+@app.on_event("startup")
+async def start_gc():
+    app.state.gc_task = asyncio.create_task(gc_loop())
+
+@app.on_event("startup")
+async def warm_up_search():
+    # Модели, индексы и клиенты OpenAI загружаются при старте, а не в первом запросе
+    await run_model(warm_up)
+
+@app.on_event("shutdown")
+async def close_clients():
+    app.state.gc_task.cancel()
+    await http_client.aclose()
+    shutdown_pools()
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:3000"],  # или ["*"] для всех
@@ -44,16 +77,20 @@ app.mount("/pdfs", StaticFiles(directory="pdfs"), name="pdfs")
 #     return "\n\n".join(translated_paragraphs)
 
     
+SOURCE_TAG_RE = re.compile(r'\[Источник:\s*"?([^"\]]+)"?\]')
+SOURCE_TAG_WINDOW = 300  # символов начала потокового ответа, в которых ожидается тег источника
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}  # nginx не буферизует поток
+
+def tag_source(match):
+    source = match.group(1).strip()
+    return None if source.lower() == "без источника" else source
+
 def extract_source_and_clean_text(text: str):
     text = text.lstrip()
 
-    match = re.search(r'\[Источник:\s*"?([^"\]]+)"?\]', text)
+    match = SOURCE_TAG_RE.search(text)
     if match:
-        source = match.group(1).strip()
-        cleaned_text = text[:match.start()] + text[match.end():]
-        if source.lower() == "без источника":
-            return None, cleaned_text
-        return source, cleaned_text
+        return tag_source(match), text[:match.start()] + text[match.end():]
 
     return None, text
 
@@ -75,123 +112,195 @@ class UrlRequest(BaseModel):
     short_context: str
     lang: str
 
-# === API endpoint для резюмирования запроса по URL ===
-@app.post("/summarize-request")
-async def summarize_request(data: SummarizeRequestParams):
-    file_url = data.url
-    lang = data.lang
-    system_promps = f"""Ты — официальный помощник. Сделай краткое, деловое резюме запроса.
+class RequestInputError(Exception):
+    # Ошибка входных данных: отдаётся клиенту как {"error": ...} с указанным кодом
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class SourceTagParser:
+    """
+    Вырезает [Источник: ...] из потока токенов. Начало ответа придерживается,
+    пока тег не найден или пока не пройдено SOURCE_TAG_WINDOW символов без тега.
+    Тег дальше в ответе тоже вырезается: текст с "[" придерживается, пока не ясно, тег ли это.
+    new_source — источник определён или изменился, его нужно отправить клиенту.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.text = ""
+        self.source = None
+        self.resolved = False
+        self.new_source = False
+
+    def feed(self, delta: str) -> str:
+        self.buffer += delta
+        if not self.resolved:
+            waiting_for_tag = "[Источник" in self.buffer and len(self.buffer) <= 2 * SOURCE_TAG_WINDOW
+            if not SOURCE_TAG_RE.search(self.buffer) and (len(self.buffer) <= SOURCE_TAG_WINDOW or waiting_for_tag):
+                return ""
+            self.resolve()
+        return self.release()
+
+    def flush(self) -> str:
+        if not self.resolved:
+            self.resolve()
+        return self.release(final=True)
+
+    def resolve(self):
+        self.resolved = True
+        self.new_source = True
+        self.source, self.buffer = extract_source_and_clean_text(self.buffer)
+
+    def release(self, final: bool = False) -> str:
+        while match := SOURCE_TAG_RE.search(self.buffer):
+            if self.source is None and tag_source(match) is not None:
+                self.source = tag_source(match)
+                self.new_source = True
+            self.buffer = self.buffer[:match.start()] + self.buffer[match.end():]
+        end = len(self.buffer) if final else self.tag_start()
+        text, self.buffer = self.buffer[:end], self.buffer[end:]
+        self.text += text
+        return text
+
+    def tag_start(self) -> int:
+        # Позиция "[", с которой может начинаться ещё не дописанный тег, иначе конец буфера
+        start = self.buffer.rfind("[")
+        tail = self.buffer[start:]
+        if start >= 0 and "]" not in tail and len(tail) <= SOURCE_TAG_WINDOW and \
+                ("[Источник".startswith(tail) or tail.startswith("[Источник")):
+            return start
+        return len(self.buffer)
+
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def summarize_system_prompt(lang: str) -> str:
+    return f"""Ты — официальный помощник. Сделай краткое, деловое резюме запроса.
         Ответ переведи на: '{lang}'.
         Сформируй результат в виде HTML с корректной разметкой: 
         используй <p> для абзацев, сохраняй логические отступы и структуру текста.
         Важно не добавляй пояснений не в начале не в конце ни каких! типа: ```html
     """
 
+async def fetch_request_text(file_url: str) -> str:
+    # Сохраняем PDF временно: скачивается частями, с ограничением размера и проверкой сигнатуры
+    uid = uuid.uuid4().hex
+    temp_path = Path(f"temp/request_{uid}.pdf")
+    temp_path.parent.mkdir(exist_ok=True)
     try:
-        response = httpx.get(file_url, verify=False)
-        if response.status_code != 200:
-            return {"error": "Не удалось скачать PDF"}
+        await download_to_file(http_client, file_url, temp_path, "pdf")
+    except UploadError as e:
+        raise RequestInputError(str(e), status_code=e.status_code)
 
-        # Сохраняем PDF временно
-        uid = uuid.uuid4().hex
-        temp_path = Path(f"temp/request_{uid}.pdf")
-        temp_path.parent.mkdir(exist_ok=True)
-        with open(temp_path, "wb") as f:
-            f.write(response.content)
+    request_text = await run_io(extract_text_from_pdf, str(temp_path))
+    if not request_text.strip():
+        raise RequestInputError("PDF-файл не содержит текст. Возможно, он состоит только из изображений.")
+    return request_text
 
-        request_text = extract_text_from_pdf(str(temp_path))
-        if not request_text.strip():
-            return JSONResponse(
-                content={"error": "PDF-файл не содержит текст. Возможно, он состоит только из изображений."},
-                status_code=400
-            )
-        summary = query_openai(system_promps, request_text+f"""Ответ переведи на язык: {lang}""")
+# === API endpoint для резюмирования запроса по URL ===
+@app.post("/summarize-request")
+async def summarize_request(data: SummarizeRequestParams):
+    file_url = data.url
+    lang = data.lang
+
+    try:
+        request_text = await fetch_request_text(file_url)
+        summary = await query_openai_async(summarize_system_prompt(lang), request_text+f"""Ответ переведи на язык: {lang}""")
         # if USE_OLLAMA:
         #     summary = summarize_with_ollama(translated_text)
         # else:
         #     summary = summarize_with_openai(translated_text, lang)
 
         return {"summary": clean_html_code_block(summary)}
+    except RequestInputError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=e.status_code)
     except Exception as e:
         return {"error": str(e)}
 
+@app.post("/summarize-request/stream")
+async def summarize_request_stream(data: SummarizeRequestParams):
+    """
+    SSE: события token (HTML по мере генерации), summary (итоговый очищенный HTML) или error.
+    """
+    try:
+        request_text = await fetch_request_text(data.url)
+    except RequestInputError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=e.status_code)
+    except Exception as e:
+        return JSONResponse(content={"error": str(e)}, status_code=500)
+
+    async def events():
+        try:
+            summary = ""
+            async for delta in stream_chat_completion(summarize_system_prompt(data.lang),
+                                                      request_text+f"""Ответ переведи на язык: {data.lang}"""):
+                summary += delta
+                yield sse_event("token", delta)
+            yield sse_event("summary", {"summary": clean_html_code_block(summary)})
+        except Exception as e:
+            yield sse_event("error", {"error": str(e)})
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
 def extract_doc_text(doc_path: str) -> str:
     result = subprocess.run(["antiword", doc_path], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
     if result.returncode == 0:
         return result.stdout.decode("utf-8")
     else:
         raise RuntimeError(f"Ошибка при извлечении текста: {result.stderr.decode()}")
-    
-@app.post("/generate-request/")
-async def generate_by_upload(
-    file: Optional[UploadFile] = File(None),
-    short_context: str = Form(...),
-    lang: str = Form(...),
-    content_text: Optional[str] = Form(None)
-):
-    try:
-        uid = uuid.uuid4().hex
-        request_text = ""
-
-        # === 1. Обработка файла, если он есть ===
-        if file:
-            ext = file.filename.split('.')[-1].lower()
-            temp_dir = Path("requests")
-            temp_dir.mkdir(exist_ok=True)
-            temp_path = temp_dir / f"request_{uid}.{ext}"
-
-            with open(temp_path, "wb") as f:
-                f.write(await file.read())
-
-            if ext == "pdf":
-                request_text = extract_text_from_pdf(str(temp_path))
-                if not request_text.strip():
-                    return JSONResponse(
-                        content={"error": "PDF-файл не содержит текст. Возможно, он состоит только из изображений."},
-                        status_code=400
-                    )
-            elif ext == "docx":
-                doc = Document(str(temp_path))
-                request_text = "\n".join([para.text for para in doc.paragraphs])
-                if not request_text.strip():
-                    return JSONResponse(
-                        content={"error": "docx-файл не содержит текст. Возможно, он состоит только из изображений."},
-                        status_code=400
-                    )
-            elif ext == "doc":
-                request_text = extract_doc_text(str(temp_path))
-                if not request_text.strip():
-                    return JSONResponse(
-                        content={"error": "doc-файл не содержит текст. Возможно, он состоит только из изображений."},
-                        status_code=400
-                    )
-            else:
-                return JSONResponse(content={"error": f"Неподдерживаемый формат: .{ext}"}, status_code=400)
-
-        # === 2. Если файла нет, берём content_text ===
-        elif content_text:
-            request_text = content_text
-        else:
-            return JSONResponse(
-                content={"error": "Необходимо прикрепить файл или передать текст"},
-                status_code=400
-            )
-
-        # === Перевод текста ===
-        translated_request_text = translate_kazakh_to_russian(request_text)
-
-        # === Поиск и генерация ===
-        results = search_by_title_summary(short_context)
-        similar_docs = [
-            {
-                "text": r["text"],
-                "context_text": r.get("context_text", r["text"]),
-                "source": r.get("source", "неизвестный файл")
-            }
-            for r in results
-        ]
-
-        system_prompt = f"""Ты — официальный помощник депутата Мажилиса Парламента Республики Казахстан.
+
+def extract_docx_text(docx_path: str) -> str:
+    doc = Document(docx_path)
+    return "\n".join([para.text for para in doc.paragraphs])
+
+async def read_request_text(uid: str, file: Optional[UploadFile], content_text: Optional[str]) -> str:
+    # === 1. Обработка файла, если он есть ===
+    if file:
+        ext = file.filename.split('.')[-1].lower()
+        temp_dir = Path("requests")
+        temp_dir.mkdir(exist_ok=True)
+        temp_path = temp_dir / f"request_{uid}.{ext}"
+
+        extractors = {"pdf": extract_text_from_pdf, "docx": extract_docx_text, "doc": extract_doc_text}
+        if ext not in extractors:
+            raise RequestInputError(f"Неподдерживаемый формат: .{ext}")
+
+        try:
+            await save_upload(file, temp_path, ext)
+        except UploadError as e:
+            raise RequestInputError(str(e), status_code=e.status_code)
+        request_text = await run_io(extractors[ext], str(temp_path))
+        if not request_text.strip():
+            name = "PDF" if ext == "pdf" else ext
+            raise RequestInputError(f"{name}-файл не содержит текст. Возможно, он состоит только из изображений.")
+        return request_text
+
+    # === 2. Если файла нет, берём content_text ===
+    if content_text:
+        return content_text
+    raise RequestInputError("Необходимо прикрепить файл или передать текст")
+
+async def find_similar_docs(short_context: str, request_text: str):
+    # === Перевод текста ===
+    translated_request_text = await run_io(translate_kazakh_to_russian, request_text)
+
+    # === Поиск ===
+    results = await run_model(search_hybrid, short_context, translated_request_text)
+    similar_docs = [
+        {
+            "text": r["text"],
+            "context_text": r.get("context_text", r["text"]),
+            "source": r.get("source", "неизвестный файл")
+        }
+        for r in results
+    ]
+    return translated_request_text, similar_docs
+
+def request_system_prompt(lang: str) -> str:
+    return f"""Ты — официальный помощник депутата Мажилиса Парламента Республики Казахстан.
         Твоя задача — помочь сформулировать официальный депутатский запрос на основании предоставленных данных.
 
         Используй деловой, официальный стиль. Структурируй текст логично: введение, суть обращения, конкретные вопросы или предложения.
@@ -207,33 +316,99 @@ async def generate_by_upload(
         — не пиши ничего кроме самого HTML-контента;
         — сохраняй официальную структуру текста: обращение, суть проблемы, обоснование, формулировка запроса.
         """
-        # print(translated_request_text)
-        
-        # просмотреть содержимое индекса
-        # with open("faiss_index/meta.json", "r", encoding="utf-8") as f:
-        #     meta = json.load(f)
 
-        # for i, item in enumerate(meta[:10]):  # покажем первые 10
-        #     print(f"🔹 [{i}] context_text: {item.get('context_text', '')[:100]}")
+@app.post("/generate-request/")
+async def generate_by_upload(
+    file: Optional[UploadFile] = File(None),
+    short_context: str = Form(...),
+    lang: str = Form(...),
+    content_text: Optional[str] = Form(None)
+):
+    try:
+        uid = uuid.uuid4().hex
+        request_text = await read_request_text(uid, file, content_text)
 
-        ai_response = generate_answer(translated_request_text, similar_docs, system_prompt, lang, use_openai=True)
+        # === Перевод, поиск и генерация ===
+        translated_request_text, similar_docs = await find_similar_docs(short_context, request_text)
+        ai_response = await generate_answer_async(translated_request_text, similar_docs, request_system_prompt(lang), lang, use_openai=True)
 
-        # === Сохраняем PDF ===
+        # === PDF строится в фоне, готовность — GET /jobs/{pdf_job_id} ===
         Path("answers").mkdir(exist_ok=True)
-        pdf_file = f"{uid}_answer.pdf"
         source, cleaned = extract_source_and_clean_text(ai_response["ai_answer"])
-        save_html_to_pdf(cleaned, pdf_file)
+        pdf_file = artifact_name("pdf", cleaned)
+        pdf_job_id = render_jobs.submit(save_html_to_pdf, cleaned, pdf_file)
 
         return {
             "fragments_list": ai_response["fragments_list"],
             "text": clean_html_code_block(cleaned),
             "pdf_url": f"/answers/{pdf_file}",
+            "pdf_job_id": pdf_job_id,
             "file_contenxt_source": source
         }
 
+    except RequestInputError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=e.status_code)
     except Exception as e:
         return JSONResponse(content={"error": str(e)}, status_code=500)
 
+@app.post("/generate-request/stream")
+async def generate_by_upload_stream(
+    file: Optional[UploadFile] = File(None),
+    short_context: str = Form(...),
+    lang: str = Form(...),
+    content_text: Optional[str] = Form(None)
+):
+    """
+    SSE-вариант /generate-request/. События по порядку: status, fragments (fragments_list),
+    source (file_contenxt_source), token (HTML по мере генерации), text (итоговый HTML), pdf (pdf_url);
+    при сбое — error.
+    """
+    uid = uuid.uuid4().hex
+    try:
+        # Файл читается до начала потока: после ответа UploadFile уже закрыт
+        request_text = await read_request_text(uid, file, content_text)
+    except RequestInputError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=e.status_code)
+    except Exception as e:
+        return JSONResponse(content={"error": str(e)}, status_code=500)
+
+    async def events():
+        try:
+            yield sse_event("status", {"stage": "search"})
+            translated_request_text, similar_docs = await find_similar_docs(short_context, request_text)
+            prompt, fragments_list = build_answer_prompt(translated_request_text, similar_docs)
+            yield sse_event("fragments", fragments_list)
+
+            parser = SourceTagParser()
+            async for delta in stream_chat_completion(request_system_prompt(lang), prompt+f"""Ответ переведи на язык: {lang}"""):
+                text = parser.feed(delta)
+                if parser.new_source:
+                    parser.new_source = False
+                    yield sse_event("source", {"file_contenxt_source": parser.source})
+                if text:
+                    yield sse_event("token", text)
+            text = parser.flush()
+            if parser.new_source:
+                yield sse_event("source", {"file_contenxt_source": parser.source})
+            if text:
+                yield sse_event("token", text)
+
+            cleaned = clean_html_code_block(parser.text)
+            yield sse_event("text", {"text": cleaned})
+
+            # === Сохраняем PDF: событие pdf приходит, когда задание рендеринга завершено ===
+            Path("answers").mkdir(exist_ok=True)
+            pdf_job_id = render_jobs.submit(save_html_to_pdf, parser.text, artifact_name("pdf", parser.text))
+            job = await render_jobs.wait(pdf_job_id)
+            if job["status"] == "done":
+                yield sse_event("pdf", {"pdf_url": job["url"], "pdf_job_id": pdf_job_id})
+            else:
+                yield sse_event("error", {"error": job["error"], "pdf_job_id": pdf_job_id})
+        except Exception as e:
+            yield sse_event("error", {"error": str(e)})
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
 # @app.post("/generate-by-url/")
 # async def generate_by_url(payload: UrlRequest):
 #     file_url = payload.url
@@ -273,7 +448,7 @@ async def generate_by_upload(
 #             В начале ответа укажи источник релевантного фрагмента если какой то использовал, если не использовал то пиши что без источника, пример: если есть: [Источник: "8863_10026.pdf"] если нет: [Источник: "без источника"]
 #         """
 #         # Генерируем ответ
-#         ai_response = generate_answer(translated_request_text, similar_docs, system_prompt, lang, use_openai=True)
+#         ai_response = await generate_answer_async(translated_request_text, similar_docs, system_prompt, lang, use_openai=True)
 
 #         # Сохраняем
 #         Path("answers").mkdir(exist_ok=True)
@@ -292,49 +467,85 @@ async def generate_by_upload(
 #     except Exception as e:
 #         return {"error": str(e)}
     
+PDF_MEDIA_TYPE = "application/pdf"
+DOCX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+DELIVERY_MODES = ("file", "inline", "memory")
+
+async def deliver_from_memory(render_bytes, html: str, filename: str, media_type: str, delivery: str, url_key: str):
+    """
+    inline — файл в теле ответа; memory — ссылка /artifacts/{id} на копию в памяти.
+    В обоих режимах answers/ не используется.
+    """
+    data = await run_render(render_bytes, html)
+    if delivery == "inline":
+        return Response(content=data, media_type=media_type,
+                        headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+    artifact_id = memory_artifacts.put(data, media_type, filename)
+    return {
+        "message": "✅ Файл создан в памяти",
+        url_key: f"/artifacts/{artifact_id}",
+        "expires_in": memory_artifacts.ttl
+    }
+
 # 📄 HTML → PDF
 @app.post("/generate-pdf-from-html/")
-async def generate_pdf_from_html(html: str = Form(...)):
-    filename = f"{uuid4().hex}_from_html.pdf"
-    save_html_to_pdf(html, filename)
+async def generate_pdf_from_html(html: str = Form(...), delivery: str = Form("file")):
+    # delivery: file — answers/ через очередь рендеринга (архив), inline или memory — без диска
+    if delivery not in DELIVERY_MODES:
+        return JSONResponse(content={"error": f"Неизвестный режим delivery: {delivery}"}, status_code=400)
+    filename = artifact_name("pdf", html)
+    if delivery != "file":
+        return await deliver_from_memory(render_pdf_bytes, html, filename, PDF_MEDIA_TYPE, delivery, "pdf_url")
+    job_id = render_jobs.submit(save_html_to_pdf, html, filename)
     return {
-        "message": "✅ PDF создан из HTML",
-        "pdf_url": f"/answers/{filename}"
+        "message": "⏳ PDF поставлен в очередь",
+        "pdf_url": f"/answers/{filename}",
+        "job_id": job_id
     }
 @app.post("/generate-docx-from-html/")
-async def generate_docx_from_html(html: str = Form(...)):
-    filename = f"{uuid4().hex}_from_html.docx"
-    save_to_docx(html, filename)
+async def generate_docx_from_html(html: str = Form(...), delivery: str = Form("file")):
+    if delivery not in DELIVERY_MODES:
+        return JSONResponse(content={"error": f"Неизвестный режим delivery: {delivery}"}, status_code=400)
+    filename = artifact_name("docx", html)
+    if delivery != "file":
+        return await deliver_from_memory(render_docx_bytes, html, filename, DOCX_MEDIA_TYPE, delivery, "docx_url")
+    job_id = render_jobs.submit(save_to_docx, html, filename)
     return {
-        "message": "✅ DOCX создан из HTML",
-        "docx_url": f"/answers/{filename}"
+        "message": "⏳ DOCX поставлен в очередь",
+        "docx_url": f"/answers/{filename}",
+        "job_id": job_id
     }
 
+@app.get("/artifacts/{artifact_id}")
+async def get_artifact(artifact_id: str):
+    item = memory_artifacts.get(artifact_id)
+    if item is None:
+        raise HTTPException(status_code=404, detail="Файл не найден или срок хранения истёк")
+    return Response(content=item["data"], media_type=item["media_type"],
+                    headers={"Content-Disposition": f'attachment; filename="{item["filename"]}"'})
+
+@app.get("/metrics/disk")
+async def get_disk_metrics():
+    # Файлов, МБ и возраст старейшего файла по каталогам answers/, requests/, temp/
+    return await run_io(disk_usage)
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    # status: queued | running | done | failed; url — адрес файла в /answers
+    job = render_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Задание не найдено")
+    return job
+
 @app.post("/translate-html/")
 async def translate_html(html: str = Form(...), target_lang: str = Form(...)):
     try:
-        # Разбор HTML
-        soup = BeautifulSoup(html, "html.parser")
-        # Сформируй результат в виде HTML с корректной разметкой, 
-        # используй <p> для абзацев, сохраняй логические отступы и структуру текста.
-
-        # Перевод каждого текстового элемента
-        for tag in soup.find_all(string=True):
-            original_text = tag.strip()
-            if original_text:
-                system_promps = "Ты профессиональный переводчик"
-                prompt = f"""
-                    Переведи следующий текст на {target_lang}.
-
-                    Сохрани стиль, но не добавляй пояснений, только перевод
-                    {original_text}
-                """
-                translated = query_openai(system_promps, prompt)
-                tag.replace_with(translated)
+        # Все текстовые узлы переводятся несколькими параллельными пакетами, разметка сохраняется
+        translated_html = await run_io(translate_html_segments, html, target_lang)
 
         return {
             "message": f"✅ Перевод выполнен на {target_lang}",
-            "translated_html": clean_html_code_block(str(soup))
+            "translated_html": clean_html_code_block(translated_html)
         }
 
     except Exception as e:
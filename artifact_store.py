@@ -0,0 +1,102 @@
+# artifact_store.py
+# Имена файлов в answers/ по содержимому и очистка answers/, requests/, temp/ по возрасту и размеру.
+#   python artifact_store.py stats — занятое место
+#   python artifact_store.py gc     — очистка по правилам DIR_POLICIES
+import argparse
+import hashlib
+import os
+import time
+from pathlib import Path
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Меняется при изменении вида документов, чтобы не отдавать файлы, отрисованные по-старому
+RENDER_VERSION = "1"
+
+GC_INTERVAL_MINUTES = int(os.getenv("GC_INTERVAL_MINUTES", "60"))
+
+# Каталог: (срок хранения в часах, предельный размер в МБ); использование файла продлевает срок
+DIR_POLICIES = {
+    "answers": (int(os.getenv("ANSWERS_TTL_HOURS", "720")), int(os.getenv("ANSWERS_MAX_MB", "2048"))),
+    "requests": (int(os.getenv("REQUESTS_TTL_HOURS", "168")), int(os.getenv("REQUESTS_MAX_MB", "1024"))),
+    "temp": (int(os.getenv("TEMP_TTL_HOURS", "24")), int(os.getenv("TEMP_MAX_MB", "512"))),
+}
+
+
+def artifact_name(kind: str, content: str) -> str:
+    """
+    Имя файла по хэшу входного HTML, вида документа и версии рендеринга:
+    одинаковый запрос отдаёт уже построенный файл.
+    """
+    digest = hashlib.sha256(f"{kind}\0{RENDER_VERSION}\0{content}".encode("utf-8")).hexdigest()
+    return f"{digest[:32]}.{kind}"
+
+def touch(path: Path):
+    # mtime — время последнего использования, по нему считаются срок хранения и LRU
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        pass
+
+def list_files(directory: str) -> list:
+    files = []
+    for entry in os.scandir(directory) if Path(directory).is_dir() else []:
+        if entry.is_file():
+            stat = entry.stat()
+            files.append((entry.path, stat.st_size, stat.st_mtime))
+    return files
+
+def disk_usage() -> dict:
+    now = time.time()
+    usage = {}
+    for directory, (ttl_hours, max_mb) in DIR_POLICIES.items():
+        files = list_files(directory)
+        usage[directory] = {
+            "files": len(files),
+            "size_mb": round(sum(size for _, size, _ in files) / (1024 * 1024), 2),
+            "oldest_hours": round((now - min(m for _, _, m in files)) / 3600, 1) if files else 0,
+            "ttl_hours": ttl_hours,
+            "max_mb": max_mb
+        }
+    return usage
+
+def collect_garbage() -> dict:
+    """
+    Удаляет файлы старше срока хранения, затем самые давно использованные,
+    пока каталог не уложится в предельный размер. Возвращает число удалённых файлов по каталогам.
+    """
+    now = time.time()
+    removed = {}
+    for directory, (ttl_hours, max_mb) in DIR_POLICIES.items():
+        files = sorted(list_files(directory), key=lambda f: f[2])
+        total = sum(size for _, size, _ in files)
+        count = 0
+        for path, size, mtime in files:
+            if now - mtime <= ttl_hours * 3600 and total <= max_mb * 1024 * 1024:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                count += 1
+            except OSError as e:
+                print(f"⚠️ Не удалось удалить {path}: {e}")
+        removed[directory] = count
+    if any(removed.values()):
+        print(f"🧹 Очистка артефактов: {removed}")
+    return removed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Занятое место и очистка answers/, requests/, temp/")
+    parser.add_argument("command", choices=["stats", "gc"])
+    args = parser.parse_args()
+
+    if args.command == "gc":
+        collect_garbage()
+    for directory, usage in disk_usage().items():
+        print(f"📁 {directory}: {usage['files']} файлов, {usage['size_mb']} МБ, старейший {usage['oldest_hours']} ч")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import argparse
+import random
+import time
+import numpy as np
+from meta_store import META_DB_PATH, open_meta_store
+from embeddings import EMBEDDING_BACKENDS, EMBEDDING_MODEL, embedding_config, embedding_id, load_embedder
+from vector_index import METRIC, METRICS, build_index_from_vectors, search_index
+
+
+def build_corpus(meta_store, documents: int, seed: int):
+    """
+    Корпус — все чанки случайной выборки документов, запрос — заголовок документа.
+    Правильный ответ — любой чанк этого документа.
+    """
+    rng = random.Random(seed)
+    docs = [d for d in meta_store.iter_documents() if d["title"]]
+    chunk_ids = meta_store.document_chunk_ids([d["id"] for d in docs])
+    docs = [d for d in docs if chunk_ids[d["id"]]]
+    docs = rng.sample(docs, min(documents, len(docs)))
+    chunks = meta_store.get_chunks([c for d in docs for c in chunk_ids[d["id"]]])
+    return [d["title"] for d in docs], [d["id"] for d in docs], [c["text"] for c in chunks], [c["doc_id"] for c in chunks]
+
+
+def evaluate(label: str, model, queries, query_docs, texts, text_docs, k: int, metric: str, reference=None):
+    started = time.perf_counter()
+    vectors = model.encode(texts, batch_size=64)
+    encode_rate = len(texts) / (time.perf_counter() - started)
+    index = build_index_from_vectors(vectors, index_type="flat", metric=metric, storage="fp32")
+
+    latencies, rankings = [], []
+    for query in queries:
+        started = time.perf_counter()
+        query_vector = model.encode([query])
+        latencies.append(time.perf_counter() - started)
+        _, found = search_index(index, query_vector, k)
+        rankings.append([int(i) for i in found[0] if i >= 0])
+
+    reciprocal_ranks = []
+    for doc_id, ranking in zip(query_docs, rankings):
+        ranks = [r for r, i in enumerate(ranking) if text_docs[i] == doc_id]
+        reciprocal_ranks.append(1 / (ranks[0] + 1) if ranks else 0)
+
+    agreement = ""
+    if reference is not None:
+        overlap = np.mean([len(set(a) & set(b)) / k for a, b in zip(rankings, reference)])
+        agreement = f"   пересечение top-{k} с эталоном {overlap:.2f}"
+    print(f"{label:<44} MRR@{k} {np.mean(reciprocal_ranks):.3f}   hit@{k} {np.mean([r > 0 for r in reciprocal_ranks]):.2f}   "
+          f"{encode_rate:6.1f} чанков/с   запрос p50 {np.percentile(latencies, 50) * 1000:6.1f} мс{agreement}")
+    return rankings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Качество поиска и скорость эмбеддингов: torch/int8/onnx и размерность")
+    parser.add_argument("--model", default=EMBEDDING_MODEL)
+    parser.add_argument("--backends", nargs="+", default=list(EMBEDDING_BACKENDS), choices=EMBEDDING_BACKENDS)
+    parser.add_argument("--dims", type=int, nargs="+", default=[0, 512], help="0 — полная размерность")
+    parser.add_argument("--documents", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--metric", default=METRIC, choices=list(METRICS))
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    queries, query_docs, texts, text_docs = build_corpus(open_meta_store(META_DB_PATH, readonly=True), args.documents, args.seed)
+    print(f"📊 Запросов: {len(queries)}, чанков: {len(texts)}, метрика: {args.metric}")
+
+    # Эталон — текущая конфигурация индекса: torch, полная размерность
+    baseline = embedding_config(args.model, "torch", 0)
+    reference = evaluate(f"{embedding_id(baseline)} (эталон)", load_embedder(baseline),
+                         queries, query_docs, texts, text_docs, args.k, args.metric)
+    for backend in args.backends:
+        for dim in args.dims:
+            if (backend, dim) == ("torch", 0):
+                continue
+            config = embedding_config(args.model, backend, dim)
+            try:
+                model = load_embedder(config)
+            except ImportError as e:
+                print(f"⚠️ {backend}: не установлена зависимость ({e})")
+                break
+            evaluate(embedding_id(config), model, queries, query_docs, texts, text_docs,
+                     args.k, args.metric, reference)
+
+
+if __name__ == "__main__":
+    main()
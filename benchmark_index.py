@@ -0,0 +1,86 @@
+import argparse
+import time
+import faiss
+import numpy as np
+from pathlib import Path
+from vector_index import (INDEX_TYPES, METRIC, METRICS, STORAGE, STORAGE_CODES, build_index_from_vectors,
+                          configure_search, extract_vectors, search_index)
+
+INDEX_PATH = "faiss_index/index.faiss"
+SUMMARY_INDEX_PATH = "faiss_index/summary_index.faiss"
+
+
+def load_vectors():
+    # База — векторы чанков, запросы — векторы заголовков и выжимок документов
+    _, base = extract_vectors(faiss.read_index(INDEX_PATH))
+    _, queries = extract_vectors(faiss.read_index(SUMMARY_INDEX_PATH))
+    return np.ascontiguousarray(base, dtype="float32"), np.ascontiguousarray(queries, dtype="float32")
+
+
+def recall_at_k(found, truth, k):
+    hits = sum(len(set(f[:k]) & set(t[:k])) for f, t in zip(found, truth))
+    return hits / (len(truth) * k)
+
+
+def measure(index, queries, k):
+    # Замер по одному запросу, как в API
+    latencies = []
+    found = []
+    for q in queries:
+        start = time.perf_counter()
+        _, ids = search_index(index, q.reshape(1, -1), k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        found.append(ids[0])
+    return np.array(found), np.percentile(latencies, 50), np.percentile(latencies, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение типов FAISS-индекса с точным поиском")
+    parser.add_argument("--types", nargs="+", default=list(INDEX_TYPES), choices=INDEX_TYPES)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=500, help="максимум запросов")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[16, 64, 256])
+    parser.add_argument("--metric", default=METRIC, choices=list(METRICS))
+    parser.add_argument("--storage", default=STORAGE, choices=list(STORAGE_CODES))
+    args = parser.parse_args()
+
+    if not Path(INDEX_PATH).exists() or not Path(SUMMARY_INDEX_PATH).exists():
+        print("❌ Индекс не найден, сначала запустите build_index.py")
+        return
+
+    base, queries = load_vectors()
+    rng = np.random.default_rng(0)
+    if len(queries) > args.queries:
+        queries = queries[rng.choice(len(queries), args.queries, replace=False)]
+    print(f"📊 База: {len(base)} векторов, запросов: {len(queries)}, k={args.k}, "
+          f"метрика: {args.metric}, хранение: {args.storage}")
+
+    exact = build_index_from_vectors(base, index_type="flat", metric=args.metric, storage="fp32")
+    truth, p50, p99 = measure(exact, queries, args.k)
+
+    print(f"{'индекс':<28}{'recall@k':>10}{'p50, мс':>10}{'p99, мс':>10}{'МБ':>10}{'сборка, с':>12}")
+    print(f"{'flat (эталон)':<28}{1.0:>10.3f}{p50:>10.3f}{p99:>10.3f}{base.nbytes / 2**20:>10.1f}{0:>12.1f}")
+
+    for index_type in args.types:
+        start = time.perf_counter()
+        index = build_index_from_vectors(base, index_type=index_type, metric=args.metric, storage=args.storage)
+        build_time = time.perf_counter() - start
+        size_mb = len(faiss.serialize_index(index)) / 2**20
+
+        if index_type == "hnsw":
+            settings = [("efSearch", value, {"ef_search": value}) for value in args.ef_search]
+        elif index_type == "flat":
+            settings = [("", "", {})]
+        else:
+            settings = [("nprobe", value, {"nprobe": value}) for value in args.nprobe]
+
+        for name, value, params in settings:
+            configure_search(index, **params)
+            found, p50, p99 = measure(index, queries, args.k)
+            label = f"{index_type} {name}={value}" if name else index_type
+            print(f"{label:<28}{recall_at_k(found, truth, args.k):>10.3f}{p50:>10.3f}{p99:>10.3f}{size_mb:>10.1f}{build_time:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import argparse
+import time
+from io import BytesIO
+from bs4 import BeautifulSoup
+from reportlab import rl_config
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.platypus import SimpleDocTemplate, ListFlowable, ListItem, Paragraph, Spacer, Image
+from utils import FONT_PATH, HEADER_PDF_PATH, PdfRenderer
+
+SAMPLE_HTML = (
+    "<p>Уважаемый министр!</p>"
+    + "".join(f"<p>Абзац {i}: обращение жителей района по вопросу ремонта дорог, водоснабжения и отопления "
+              f"социальных объектов. Просим рассмотреть возможность выделения средств.</p>" for i in range(12))
+    + "<ol>" + "".join(f"<li>Вопрос {i}</li>" for i in range(5)) + "</ol>"
+)
+
+
+def render_legacy(html_string: str, output):
+    """
+    save_html_to_pdf до PdfRenderer: шрифт и стили на каждый документ, шапка — исходный PNG
+    (читается и сжимается заново), потоки PDF в ASCII85 (useA85 по умолчанию).
+    """
+    use_a85 = rl_config.useA85
+    rl_config.useA85 = 1
+    try:
+        pdfmetrics.registerFont(TTFont("DejaVuSans", FONT_PATH))
+        doc = SimpleDocTemplate(output, pagesize=A4, leftMargin=50, rightMargin=40, topMargin=30, bottomMargin=50)
+        styles = getSampleStyleSheet()
+        styles.add(ParagraphStyle(name='KazakhText', fontName='DejaVuSans', fontSize=11, leading=16))
+
+        width, _ = A4
+        elements = [Image(HEADER_PDF_PATH, width=width - 90, height=150), Spacer(1, 12)]
+        soup = BeautifulSoup(html_string, "html.parser")
+        for tag in soup.children:
+            if tag.name == "p":
+                elements.append(Paragraph(tag.get_text(strip=True), styles['KazakhText']))
+                elements.append(Spacer(1, 8))
+            elif tag.name in ["ol", "ul"]:
+                items = [ListItem(Paragraph(li.get_text(strip=True), styles['KazakhText'])) for li in tag.find_all("li")]
+                elements.append(ListFlowable(items, bulletType='1' if tag.name == "ol" else 'bullet'))
+                elements.append(Spacer(1, 8))
+        doc.build(elements)
+    finally:
+        rl_config.useA85 = use_a85
+    return output
+
+
+def bench(label: str, render, documents: int) -> float:
+    render()  # прогрев
+    started = time.perf_counter()
+    for _ in range(documents):
+        render()
+    per_doc = (time.perf_counter() - started) / documents
+    print(f"{label:<34} {per_doc * 1000:8.1f} мс/документ")
+    return per_doc
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Время рендеринга PDF: прежний save_html_to_pdf, новый рендерер на документ и общий PdfRenderer")
+    parser.add_argument("--documents", type=int, default=50)
+    args = parser.parse_args()
+
+    legacy = bench("прежний save_html_to_pdf", lambda: render_legacy(SAMPLE_HTML, BytesIO()), args.documents)
+    # Новый рендерер (готовая шапка, без ASCII85), но подготовка шрифта, стилей и шапки на каждый документ
+    bench("новый PdfRenderer, не общий", lambda: PdfRenderer().render(SAMPLE_HTML, BytesIO()), args.documents)
+
+    renderer = PdfRenderer()
+    cached = bench("общий PdfRenderer", lambda: renderer.render(SAMPLE_HTML, BytesIO()), args.documents)
+    print(f"Ускорение относительно прежнего save_html_to_pdf: x{legacy / cached:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+import argparse
+import random
+import time
+import numpy as np
+from meta_store import META_DB_PATH, open_meta_store
+from reranking import RERANKER_BACKENDS, RERANK_MAX_WINDOWS, Reranker
+
+
+def build_cases(meta_store, queries: int, candidates: int, seed: int) -> list:
+    """
+    Запрос — заголовок документа, кандидаты — один чанк этого документа
+    и чанки случайных других документов. Правильный ответ всегда первый в списке кандидатов.
+    """
+    rng = random.Random(seed)
+    documents = [d for d in meta_store.iter_documents() if d["title"]]
+    chunk_ids = meta_store.document_chunk_ids([d["id"] for d in documents])
+    documents = [d for d in documents if chunk_ids[d["id"]]]
+    cases = []
+    for doc in rng.sample(documents, min(queries, len(documents))):
+        others = rng.sample([d for d in documents if d["id"] != doc["id"]], min(candidates - 1, len(documents) - 1))
+        ids = [rng.choice(chunk_ids[doc["id"]])] + [rng.choice(chunk_ids[d["id"]]) for d in others]
+        cases.append((doc["title"], meta_store.get_chunks(ids)))
+    return cases
+
+
+def evaluate(label: str, reranker: Reranker, cases: list, reference=None):
+    rankings, latencies, reciprocal_ranks = [], [], []
+    for query, docs in cases:
+        started = time.perf_counter()
+        scores = reranker.score(query, docs)
+        latencies.append(time.perf_counter() - started)
+        order = list(np.argsort(-scores))
+        rankings.append(order)
+        reciprocal_ranks.append(1 / (order.index(0) + 1))
+
+    agreement = ""
+    if reference is not None:
+        same_top = np.mean([a[0] == b[0] for a, b in zip(rankings, reference)])
+        agreement = f"   совпадение top-1 с эталоном {same_top:.2f}"
+    print(f"{label:<28} MRR {np.mean(reciprocal_ranks):.3f}   hit@1 {np.mean([r == 1 for r in reciprocal_ranks]):.2f}   "
+          f"p50 {np.percentile(latencies, 50) * 1000:7.1f} мс   p99 {np.percentile(latencies, 99) * 1000:7.1f} мс{agreement}")
+    return rankings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Качество и задержка rerank: обрезка против окон, torch/int8/onnx")
+    parser.add_argument("--backends", nargs="+", default=list(RERANKER_BACKENDS), choices=RERANKER_BACKENDS)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--candidates", type=int, default=16, help="чанков на запрос, как в search_hybrid")
+    parser.add_argument("--max-windows", type=int, default=RERANK_MAX_WINDOWS)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    cases = build_cases(open_meta_store(META_DB_PATH, readonly=True), args.queries, args.candidates, args.seed)
+    print(f"📊 Запросов: {len(cases)}, кандидатов на запрос: {args.candidates}")
+
+    # Эталон — прежнее поведение: весь чанк одним входом, модель обрезает его до max_length
+    reference = evaluate("torch, обрезка (как раньше)", Reranker(backend="torch", max_windows=1, cache_size=0), cases)
+    for backend in args.backends:
+        try:
+            reranker = Reranker(backend=backend, max_windows=args.max_windows, cache_size=0)
+        except ImportError as e:
+            print(f"⚠️ {backend}: не установлена зависимость ({e})")
+            continue
+        evaluate(f"{backend}, окна ≤{args.max_windows}", reranker, cases, reference)
+
+    cached = Reranker(backend=args.backends[0], max_windows=args.max_windows)
+    evaluate(f"{args.backends[0]}, первый проход", cached, cases)
+    evaluate(f"{args.backends[0]}, из кэша", cached, cases)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+import argparse
+import time
+from kazakh_translator import TRANSLATOR_BACKENDS, create_translator
+from text_extraction import extract_text_from_file, split_sentences
+from pathlib import Path
+
+SAMPLE_SENTENCES = [
+    "Қазақстан — Шығыс Еуропа мен Орталық Азияда орналасқан мемлекет.",
+    "Ол бай табиғи ресурстарға ие.",
+    "Ауылдағы мектептің жылу жүйесін жөндеу үшін қосымша қаражат бөлуді сұраймыз.",
+    "Депутаттық сауалға жауап бір ай ішінде берілуі тиіс.",
+    "Облыс әкімдігі жолдарды жөндеу жұмыстарын биыл аяқтауды жоспарлап отыр.",
+    "Тұрғындар ауыз су сапасына қатысты шағымданды.",
+]
+
+
+def load_sentences(path: str, count: int) -> list:
+    if path:
+        sentences = [s for s in split_sentences(extract_text_from_file(Path(path))) if s.strip()]
+    else:
+        sentences = SAMPLE_SENTENCES
+    return [sentences[i % len(sentences)] for i in range(count)]
+
+
+def benchmark(backend: str, sentences: list):
+    started = time.perf_counter()
+    translator = create_translator(backend)
+    load_time = time.perf_counter() - started
+
+    translator.translate(sentences[:4])  # прогрев
+    started = time.perf_counter()
+    results = translator.translate(sentences)
+    elapsed = time.perf_counter() - started
+
+    failed = sum(isinstance(r, Exception) for r in results)
+    print(f"{backend:<12} загрузка {load_time:6.1f} с   {len(sentences) / elapsed:8.1f} предложений/с   ошибок: {failed}")
+    print(f"{'':<12} {sentences[0]} → {results[0]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Скорость бэкендов перевода kk→ru (кэш переводов не используется)")
+    parser.add_argument("--backends", nargs="+", default=["local", "local_int8", "onnx"], choices=TRANSLATOR_BACKENDS)
+    parser.add_argument("--sentences", type=int, default=200)
+    parser.add_argument("--file", help="PDF/DOCX на казахском для выборки предложений")
+    args = parser.parse_args()
+
+    sentences = load_sentences(args.file, args.sentences)
+    for backend in args.backends:
+        try:
+            benchmark(backend, sentences)
+        except ImportError as e:
+            print(f"⚠️ {backend}: не установлена зависимость ({e})")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,103 +1,61 @@
-import fitz  # PyMuPDF
+import argparse
 import faiss
 import json
+import multiprocessing
 import os
-import re
-import docx
+import queue
+import threading
+import numpy as np
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 from pathlib import Path
 from tqdm import tqdm
-from sentence_transformers import SentenceTransformer
-from hashlib import md5
-from search_and_respond import query_openai
-from kazakh_translator import translate_kazakh_to_russian
+from hashlib import md5, sha256
+from search_and_respond import chat_completion, build_summary_text
+from kazakh_translator import translate_many
+from llm_dispatcher import get_dispatcher, estimate_tokens
+from translation_cache import get_translation_cache
 from topic_utils import infer_topic
+from text_extraction import extract_and_chunk, chunk_text_with_overlap, segment_text, infer_date
+from vector_index import read_index, build_index_from_vectors, train_and_add, ensure_id_map, remove_ids, check_nlist
+from meta_store import META_DB_PATH, open_meta_store
+from embeddings import (EmbeddingConfigError, embedding_config, load_embedder, check_embedding_config,
+                        save_embedding_config)
 
 SUMMARY_CACHE_PATH = "faiss_index/summary_cache.json"
 summary_cache = {}
+summary_cache_lock = threading.Lock()  # выжимки пишутся из нескольких потоков стадии перевода
 if Path(SUMMARY_CACHE_PATH).exists():
     with open(SUMMARY_CACHE_PATH, "r", encoding="utf-8") as f:
         summary_cache = json.load(f)
 
 # Настройки
 CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+PDF_DIR = "pdfs"
 INDEX_PATH = "faiss_index/index.faiss"
-META_PATH = "faiss_index/meta.json"
-META_JSONL = "faiss_index/meta.jsonl"
+SUMMARY_INDEX_PATH = "faiss_index/summary_index.faiss"
+EMBED_BATCH_SIZE = 64  # чанков в одном вызове model.encode
+QUEUE_SIZE = 8         # документов в очереди между стадиями
+PREPARE_WORKERS = 4    # документов одновременно на стадии перевода и выжимки
+SUMMARY_TOKENS = 600   # ответ summarize_text (до ~1700 символов) для лимита токенов
+SEGMENT_CHARS = 4000   # размер сегмента перевода в режиме document
+TRANSLATE_MODES = ("document", "chunk")
 
-os.makedirs("faiss_index", exist_ok=True)
+DONE = None  # признак конца очереди
 
-model = SentenceTransformer("mixedbread-ai/mxbai-embed-large-v1")
 
-if Path(INDEX_PATH).exists():
-    index = faiss.read_index(INDEX_PATH)
-else:
-    index = faiss.IndexFlatL2(1024)
-
-if Path(META_PATH).exists():
-    with open(META_PATH, encoding="utf-8") as f:
-        metadata = json.load(f)
-else:
-    metadata = []
-
-already_indexed = set((m["source"], md5(m["text"].encode()).hexdigest()) for m in metadata)
-
-
-def force_translate_to_russian(text: str) -> str:
-    text = text.strip()
-    if not text or len(text) < 30:
-        return text
-
-    try:
-        translated = translate_kazakh_to_russian(text)
-
-        return translated
-    except Exception as e:
-        print(f"⚠️ Ошибка при переводе: {e}")
-        return text
-
-def extract_text_from_pdf(path):
-    try:
-        doc = fitz.open(path)
-        return "\n".join([page.get_text() for page in doc])
-    except Exception as e:
-        print(f"⚠️ Не удалось прочитать PDF {path}: {e}")
-        return ""
-
-def extract_text_from_file(file: Path) -> str:
-    if file.suffix.lower() == ".pdf":
-        return extract_text_from_pdf(file)
-    elif file.suffix.lower() == ".docx":
-        return extract_text_from_docx(file)
-    else:
-        print(f"⚠️ Неподдерживаемый формат: {file.name}")
-        return ""
-
-def chunk_text_with_overlap(text: str, size=1000, overlap=200):
-    words = text.split()
-    chunks = []
-    start = 0
-    while start < len(words):
-        end = start + size
-        chunk = " ".join(words[start:end])
-        chunks.append(chunk.strip())
-        start += size - overlap
-    return chunks
-
-def infer_date(text):
-    match = re.search(r"\d{1,2}\s+[а-яА-Я]+\s+20\d{2}", text)
-    return match.group(0) if match else None
-
-def extract_text_from_docx(path):
-    try:
-        doc = docx.Document(path)
-        return "\n".join([para.text for para in doc.paragraphs])
-    except Exception as e:
-        print(f"⚠️ Не удалось прочитать {path}: {e}")
-        return ""
+def force_translate_to_russian(texts: list) -> list:
+    # Короткие фрагменты не переводим; остальные переводятся параллельно, порядок сохраняется
+    texts = [text.strip() for text in texts]
+    long_ids = [i for i, text in enumerate(texts) if len(text) >= 30]
+    for i, translated in zip(long_ids, translate_many([texts[i] for i in long_ids])):
+        texts[i] = translated
+    return texts
 
 def summarize_text(text: str, filename: str) -> dict:
-    if filename in summary_cache:
-        return summary_cache[filename]
+    with summary_cache_lock:
+        if filename in summary_cache:
+            return summary_cache[filename]
 
     try:
         system_prompt = (
@@ -106,13 +64,16 @@ def summarize_text(text: str, filename: str) -> dict:
             "2. `summary` — краткое содержание (до 1700 символов) самого важного.\n"
             "Ответ строго в формате JSON, без пояснений."
         )
-        response = query_openai(system_prompt, text)
+        response = get_dispatcher().call(
+            chat_completion, system_prompt, text, tokens=estimate_tokens(system_prompt, text) + SUMMARY_TOKENS
+        )
 
         try:
             parsed = json.loads(response)
-            summary_cache[filename] = parsed
-            with open(SUMMARY_CACHE_PATH, "w", encoding="utf-8") as f:
-                json.dump(summary_cache, f, ensure_ascii=False, indent=2)
+            with summary_cache_lock:
+                summary_cache[filename] = parsed
+                with open(SUMMARY_CACHE_PATH, "w", encoding="utf-8") as f:
+                    json.dump(summary_cache, f, ensure_ascii=False, indent=2)
             return parsed
         except Exception as e:
             print(f"⚠️ Ошибка разбора JSON: {e}\nОтвет: {response}")
@@ -122,59 +83,308 @@ def summarize_text(text: str, filename: str) -> dict:
         print(f"⚠️ Ошибка при генерации выжимки: {e}")
         return {"title": filename, "summary": text[:400] + "..."}
 
-all_files = [f for f in Path("pdfs").iterdir() if f.suffix.lower() in [".pdf", ".docx"] and not f.name.startswith("~")]
-for file in tqdm(all_files, desc="📄 Индексация документов"):
-    try:
-        full_text = extract_text_from_file(file)
-        if not full_text.strip():
-            print(f"⚠️ Пустой документ: {file.name}")
-            continue
-
-        translated_full_text = force_translate_to_russian(full_text) 
-        summary = summarize_text(translated_full_text, file.name)
-        print("📌 Заголовок:", summary["title"])
-
-        chunks = chunk_text_with_overlap(full_text, size=CHUNK_SIZE, overlap=200)
-
-        new_chunks = []
-        for chunk in chunks:
-            translated = force_translate_to_russian(chunk)
-            chunk_hash = md5(translated.encode()).hexdigest()
-            if (file.name, chunk_hash) not in already_indexed:
-                new_chunks.append((translated, chunk_hash))
-
-        if not new_chunks:
-            continue
-
-        embeddings = model.encode([chunk for chunk, _ in new_chunks])
-        index.add(embeddings)
-
-        for chunk, chunk_hash in new_chunks:
-            item = {
-                "source": file.name,
-                "title": summary["title"],
+def file_hash(path: Path) -> str:
+    digest = sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class IndexWriter:
+    """
+    Единственный писатель: FAISS-индексы и meta_store меняются только из основного потока.
+    Векторы копятся до конца прохода, чтобы новый индекс обучался и пополнялся одним шагом.
+    """
+
+    def __init__(self, model):
+        # Метаданные дописываются в SQLite, при первом запуске переносятся из meta.json
+        self.meta_store = open_meta_store(META_DB_PATH)
+
+        # Новый индекс создаётся в конце, когда есть векторы для обучения (IVF/PQ)
+        self.index = ensure_id_map(read_index(INDEX_PATH)) if Path(INDEX_PATH).exists() else None
+
+        # Индекс выжимок: один вектор на документ, id вектора — id документа
+        self.summary_index = ensure_id_map(read_index(SUMMARY_INDEX_PATH)) if Path(SUMMARY_INDEX_PATH).exists() else None
+
+        document_count = self.meta_store.document_count()
+        if document_count and (self.summary_index is None or self.summary_index.ntotal != document_count):
+            print("🔧 Индекс выжимок не совпадает с META, пересоздаю...")
+            documents = list(self.meta_store.iter_documents())
+            self.summary_index = build_index_from_vectors(
+                model.encode([build_summary_text(d) for d in documents]), [d["id"] for d in documents]
+            )
+
+        self.new_chunk_vectors, self.new_chunk_ids = [], []
+        self.new_summary_vectors, self.new_doc_ids = [], []
+
+    def remove_document(self, doc_id):
+        # Удаляет векторы и метаданные документа, чтобы заново проиндексировать изменённый файл
+        if doc_id is None:
+            return
+        chunk_ids = self.meta_store.remove_document(doc_id)
+        if self.index is not None:
+            self.index = remove_ids(self.index, chunk_ids)
+        if self.summary_index is not None:
+            self.summary_index = remove_ids(self.summary_index, [doc_id])
+
+    def mark_empty(self, doc: dict):
+        print(f"⚠️ Пустой документ: {doc['file'].name}")
+        self.meta_store.upsert_file(str(doc["file"]), doc["stat"].st_size, doc["stat"].st_mtime, doc["content_hash"], None)
+
+    def add_document(self, doc: dict, chunk_vectors, summary_vector):
+        file, summary, chunks = doc["file"], doc["summary"], doc["chunks"]
+        doc_id = self.meta_store.allocate_ids("documents", 1)[0]
+        chunk_ids = self.meta_store.allocate_ids("chunks", len(chunks))
+        self.meta_store.add_document(doc_id, file.name, summary["title"], summary["summary"])
+
+        items = []
+        for chunk_id, chunk in zip(chunk_ids, chunks):
+            items.append({
+                "id": chunk_id,
+                "doc_id": doc_id,
                 "document": file.stem,
                 "text": chunk,
-                "hash": chunk_hash,
-                "context_text": summary["summary"],
+                "hash": md5(chunk.encode()).hexdigest(),
                 "chunk_length": len(chunk),
                 "preview": chunk[:80].replace("\n", " ") + "...",
                 "date": infer_date(chunk),
                 "topic": infer_topic(chunk),
                 "lang": "ru"
-            }
-            metadata.append(item)
-
-    except Exception as e:
-        print(f"❌ Ошибка при обработке {file.name}: {e}")
-
-faiss.write_index(index, INDEX_PATH)
-
-with open(META_PATH, "w", encoding="utf-8") as f:
-    json.dump(metadata, f, ensure_ascii=False, indent=2)
+            })
+        self.meta_store.add_chunks(items)
+        self.meta_store.upsert_file(str(file), doc["stat"].st_size, doc["stat"].st_mtime, doc["content_hash"], doc_id)
+
+        self.new_chunk_vectors.append(chunk_vectors)
+        self.new_chunk_ids.extend(chunk_ids)
+        self.new_summary_vectors.append(summary_vector)
+        self.new_doc_ids.append(doc_id)
+
+    def save(self):
+        self.index = add_to_index(self.index, self.new_chunk_vectors, self.new_chunk_ids)
+        self.summary_index = add_to_index(self.summary_index, self.new_summary_vectors, self.new_doc_ids)
+
+        if self.index is not None:
+            check_nlist(self.index, INDEX_PATH)
+            faiss.write_index(self.index, INDEX_PATH)
+        if self.summary_index is not None:
+            check_nlist(self.summary_index, SUMMARY_INDEX_PATH)
+            faiss.write_index(self.summary_index, SUMMARY_INDEX_PATH)
+
+        # Изменения метаданных и манифеста фиксируются только после записи индексов
+        self.meta_store.commit()
+
+
+def add_to_index(index, vectors, ids):
+    if not vectors:
+        return index
+    vectors = np.vstack(vectors)
+    if index is None:
+        return build_index_from_vectors(vectors, ids)
+    return train_and_add(index, vectors, ids)
+
+def find_changed_files(writer: IndexWriter, all_files: list) -> list:
+    # === Манифест: что изменилось с прошлого запуска ===
+    meta_store = writer.meta_store
+    current_paths = {str(f) for f in all_files}
+
+    for entry in meta_store.iter_files():
+        if entry["path"] not in current_paths:
+            print(f"🗑️ Файл удалён: {entry['path']}")
+            writer.remove_document(entry["doc_id"])
+            meta_store.delete_file(entry["path"])
+
+    changed_files = []
+    for file in all_files:
+        stat = file.stat()
+        entry = meta_store.get_file(str(file))
+        if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+            continue  # не изменился, файл даже не читаем
+
+        content_hash = file_hash(file)
+        if entry and entry["content_hash"] == content_hash:
+            meta_store.upsert_file(str(file), stat.st_size, stat.st_mtime, content_hash, entry["doc_id"])
+            continue
 
-with open(META_JSONL, "w", encoding="utf-8") as f:
-    for entry in metadata:
-        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        if entry is None and meta_store.document_id(file.name) is not None:
+            # Документ проиндексирован до появления манифеста — считаем его актуальным
+            meta_store.upsert_file(str(file), stat.st_size, stat.st_mtime, content_hash, meta_store.document_id(file.name))
+            continue
 
-print("✅ Индексация завершена.")
+        if entry:
+            print(f"♻️ Файл изменён: {file.name}")
+            writer.remove_document(entry["doc_id"])
+            summary_cache.pop(file.name, None)
+        changed_files.append((file, stat, content_hash))
+    return changed_files
+
+def prepare_document(file: Path, stat, content_hash: str, full_text: str, chunks: list, translate_mode: str) -> dict:
+    # Стадия LLM: перевод и выжимка
+    doc = {"file": file, "stat": stat, "content_hash": content_hash, "chunks": []}
+    if not full_text.strip():
+        return doc
+
+    if translate_mode == "document":
+        # Документ переводится один раз сегментами по целым предложениям,
+        # чанки и текст для выжимки строятся из перевода
+        translated_full_text = " ".join(force_translate_to_russian(segment_text(full_text, SEGMENT_CHARS)))
+        doc["chunks"] = chunk_text_with_overlap(translated_full_text, size=CHUNK_SIZE, overlap=CHUNK_OVERLAP)
+    else:
+        # Полный текст и каждый чанк переводятся отдельно, одним параллельным пакетом запросов
+        translated_full_text, *doc["chunks"] = force_translate_to_russian([full_text] + chunks)
+    doc["summary"] = summarize_text(translated_full_text, file.name)
+    print("📌 Заголовок:", doc["summary"]["title"])
+    return doc
+
+def run_pipeline(changed_files: list, writer: IndexWriter, model, workers: int, translate_mode: str):
+    """
+    Извлечение и нарезка — в пуле процессов, перевод и выжимка — в PREPARE_WORKERS потоках
+    (запросы к LLM идут через общий llm_dispatcher с лимитами),
+    эмбеддинги — пачками в отдельном потоке, запись — в основном потоке.
+    Между стадиями ограниченные очереди, чтобы быстрые стадии не копили документы в памяти.
+    """
+    prepared = queue.Queue(maxsize=QUEUE_SIZE)
+    embedded = queue.Queue(maxsize=QUEUE_SIZE)
+
+    # Результат извлечения (весь текст и чанки) держится в основном процессе, пока документ не уйдёт
+    # в очередь, поэтому в работе не больше workers * 2 задач; следующая отправляется по завершении
+    # spawn, как в executors.py: модель эмбеддингов уже загружена, fork процесса с потоками torch небезопасен
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    pending = iter(changed_files)
+    futures = {}
+
+    def submit_next():
+        for file, stat, content_hash in pending:
+            futures[pool.submit(extract_and_chunk, str(file), CHUNK_SIZE, CHUNK_OVERLAP)] = (file, stat, content_hash)
+            return
+
+    # Первые задачи отправляются из основного потока до запуска остальных: процессы пула создаются здесь
+    for _ in range(workers * 2):
+        submit_next()
+
+    extracted = queue.Queue(maxsize=QUEUE_SIZE)
+
+    def prepare_worker():
+        while (item := extracted.get()) is not DONE:
+            file = item[0]
+            try:
+                prepared.put(prepare_document(*item, translate_mode))
+            except Exception as e:
+                print(f"❌ Ошибка при обработке {file.name}: {e}")
+
+    def translate_stage():
+        workers = [threading.Thread(target=prepare_worker, daemon=True) for _ in range(PREPARE_WORKERS)]
+        for worker in workers:
+            worker.start()
+        try:
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    file, stat, content_hash = futures.pop(future)
+                    try:
+                        extracted.put((file, stat, content_hash, *future.result()))
+                    except Exception as e:
+                        print(f"❌ Ошибка при обработке {file.name}: {e}")
+                    submit_next()
+        finally:
+            for _ in workers:
+                extracted.put(DONE)
+            for worker in workers:
+                worker.join()
+            prepared.put(DONE)
+
+    def embed_stage():
+        try:
+            finished = False
+            while not finished:
+                batch = [prepared.get()]
+                # Добираем документы, уже ждущие в очереди, чтобы кодировать крупными пачками
+                while batch[-1] is not DONE and sum(len(d["chunks"]) for d in batch) < EMBED_BATCH_SIZE:
+                    try:
+                        batch.append(prepared.get_nowait())
+                    except queue.Empty:
+                        break
+                if batch[-1] is DONE:
+                    finished = True
+                    batch.pop()
+
+                for d in batch:
+                    if not d["chunks"]:
+                        embedded.put((d, None, None))
+                docs = [d for d in batch if d["chunks"]]
+                if not docs:
+                    continue
+
+                try:
+                    texts = [chunk for d in docs for chunk in d["chunks"]] + [build_summary_text(d["summary"]) for d in docs]
+                    vectors = model.encode(texts, batch_size=EMBED_BATCH_SIZE)
+                except Exception as e:
+                    print(f"❌ Ошибка при расчёте эмбеддингов: {e}")
+                    continue
+
+                offset = 0
+                summary_offset = len(texts) - len(docs)
+                for i, d in enumerate(docs):
+                    chunk_vectors = vectors[offset:offset + len(d["chunks"])]
+                    offset += len(d["chunks"])
+                    embedded.put((d, chunk_vectors, vectors[summary_offset + i:summary_offset + i + 1]))
+        finally:
+            embedded.put(DONE)
+
+    threads = [threading.Thread(target=translate_stage, daemon=True), threading.Thread(target=embed_stage, daemon=True)]
+    for thread in threads:
+        thread.start()
+
+    with tqdm(total=len(changed_files), desc="📄 Индексация документов") as progress:
+        while (item := embedded.get()) is not DONE:
+            doc, chunk_vectors, summary_vector = item
+            try:
+                if chunk_vectors is None:
+                    writer.mark_empty(doc)
+                else:
+                    writer.add_document(doc, chunk_vectors, summary_vector)
+            except Exception as e:
+                print(f"❌ Ошибка при записи {doc['file'].name}: {e}")
+            progress.update(1)
+
+    for thread in threads:
+        thread.join()
+    pool.shutdown()
+
+def main():
+    parser = argparse.ArgumentParser(description="Инкрементальная индексация документов из pdfs/")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="процессов для извлечения текста и нарезки на чанки")
+    parser.add_argument("--translate-mode", default="document", choices=TRANSLATE_MODES,
+                        help="document — перевод документа один раз, чанки из перевода; chunk — перевод каждого чанка")
+    args = parser.parse_args()
+
+    os.makedirs("faiss_index", exist_ok=True)
+    # Новые векторы дописываются к старым, поэтому модель и размерность должны совпадать с индексом
+    embedding = embedding_config()
+    if Path(INDEX_PATH).exists() or Path(SUMMARY_INDEX_PATH).exists():
+        try:
+            check_embedding_config(embedding)
+        except EmbeddingConfigError as e:
+            print(f"❌ {e}")
+            return
+    model = load_embedder(embedding)
+    writer = IndexWriter(model)
+
+    all_files = [f for f in Path(PDF_DIR).iterdir() if f.suffix.lower() in [".pdf", ".docx"] and not f.name.startswith("~")]
+    changed_files = find_changed_files(writer, all_files)
+    print(f"📄 Новых или изменённых файлов: {len(changed_files)} из {len(all_files)}")
+
+    if changed_files:
+        run_pipeline(changed_files, writer, model, max(1, args.workers), args.translate_mode)
+    writer.save()
+    save_embedding_config(embedding)
+
+    stats = get_translation_cache().stats()
+    print(f"📊 Кэш переводов: попаданий {stats['hits']}, промахов {stats['misses']}, "
+          f"{stats['hit_rate']:.0%}, {stats['size_mb']:.1f} МБ")
+    print("✅ Индексация завершена.")
+
+
+if __name__ == "__main__":
+    main()
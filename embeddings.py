@@ -0,0 +1,82 @@
+# embeddings.py
+# Модель эмбеддингов для индексации и поиска: torch, int8 или ONNX Runtime, размерность Matryoshka.
+# Настройки, с которыми построены индексы, сохраняются в faiss_index/embedding.json и сверяются при загрузке.
+import json
+import os
+from pathlib import Path
+from dotenv import load_dotenv
+
+load_dotenv()
+
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "mixedbread-ai/mxbai-embed-large-v1")
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")  # torch | int8 | onnx
+EMBEDDING_BACKENDS = ("torch", "int8", "onnx")
+# Файл модели в репозитории HF для backend=onnx; onnx/model_quantized.onnx — int8-вариант ONNX
+EMBEDDING_ONNX_FILE = os.getenv("EMBEDDING_ONNX_FILE", "onnx/model.onnx")
+# 0 — полная размерность (1024 у mxbai); mxbai обучена по Matryoshka и работает и с 512.
+# Для усечённых векторов лучше FAISS_METRIC=ip: длина усечённого вектора не нормирована
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "0"))
+EMBEDDING_CONFIG_PATH = "faiss_index/embedding.json"
+
+# Индексы, построенные до появления embedding.json
+LEGACY_CONFIG = {"model": "mixedbread-ai/mxbai-embed-large-v1", "backend": "torch", "dim": 0}
+
+
+class EmbeddingConfigError(ValueError):
+    pass
+
+
+def embedding_config(model_name: str = EMBEDDING_MODEL, backend: str = EMBEDDING_BACKEND,
+                     dim: int = EMBEDDING_DIM) -> dict:
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Неизвестный EMBEDDING_BACKEND: {backend}")
+    return {"model": model_name, "backend": backend, "dim": dim}
+
+def embedding_id(config: dict) -> str:
+    # Идентификатор для кэшей векторов: разные backend и размерности дают разные векторы
+    return f"{config['model']}:{config['backend']}:{config['dim'] or 'full'}"
+
+
+def load_embedder(config: dict, onnx_file: str = EMBEDDING_ONNX_FILE):
+    from sentence_transformers import SentenceTransformer
+
+    print(f"🔍 Загрузка модели эмбеддингов: {embedding_id(config)}")
+    truncate_dim = config["dim"] or None
+    if config["backend"] == "onnx":
+        # ONNX Runtime на CPU (sentence-transformers >= 3.2 с extras [onnx])
+        return SentenceTransformer(config["model"], backend="onnx", truncate_dim=truncate_dim,
+                                   model_kwargs={"file_name": onnx_file})
+    model = SentenceTransformer(config["model"], truncate_dim=truncate_dim)
+    if config["backend"] == "int8":
+        import torch
+
+        # Динамическая квантизация Linear-слоёв: веса int8, только CPU
+        torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    return model
+
+
+def read_embedding_config(path: str = EMBEDDING_CONFIG_PATH) -> dict:
+    if not Path(path).exists():
+        return dict(LEGACY_CONFIG)
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_embedding_config(config: dict, path: str = EMBEDDING_CONFIG_PATH):
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(config, f, ensure_ascii=False, indent=2)
+
+def check_embedding_config(config: dict, path: str = EMBEDDING_CONFIG_PATH):
+    """
+    Векторы запросов должны быть из того же пространства, что и векторы индекса.
+    Другая модель или размерность — ошибка; другой backend той же модели даёт близкие векторы — предупреждение.
+    """
+    stored = read_embedding_config(path)
+    if (stored["model"], stored["dim"]) != (config["model"], config["dim"]):
+        raise EmbeddingConfigError(
+            f"Индексы построены с {embedding_id(stored)}, а настроена {embedding_id(config)}. "
+            f"Верните EMBEDDING_MODEL/EMBEDDING_DIM или пересчитайте векторы: python migrate_index.py --reencode"
+        )
+    if stored["backend"] != config["backend"]:
+        print(f"⚠️ Индексы построены с backend {stored['backend']}, запросы кодируются {config['backend']}: "
+              f"возможна небольшая потеря качества поиска.")
@@ -0,0 +1,58 @@
+# executors.py
+# Ограниченные пулы для блокирующей работы в обработчиках api.py:
+# цикл событий только ждёт результат, а число одновременных задач каждого вида задаётся в .env.
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from dotenv import load_dotenv
+
+load_dotenv()
+
+MODEL_POOL_SIZE = int(os.getenv("MODEL_POOL_SIZE", "4"))    # поиск и rerank; эмбеддинги запросов собирает в пачки query_encoder
+IO_POOL_SIZE = int(os.getenv("IO_POOL_SIZE", "16"))         # PyMuPDF, python-docx, antiword, файлы, перевод
+RENDER_POOL_SIZE = int(os.getenv("RENDER_POOL_SIZE", "2"))  # reportlab и python-docx в отдельных процессах
+API_LLM_CONCURRENCY = int(os.getenv("API_LLM_CONCURRENCY", "16"))  # одновременных запросов к OpenAI из API
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "60"))
+HTTP_MAX_REDIRECTS = int(os.getenv("HTTP_MAX_REDIRECTS", "5"))  # ссылки хранилищ и CDN часто отдают 301/302
+
+model_pool = ThreadPoolExecutor(max_workers=MODEL_POOL_SIZE, thread_name_prefix="model")
+io_pool = ThreadPoolExecutor(max_workers=IO_POOL_SIZE, thread_name_prefix="io")
+llm_semaphore = asyncio.Semaphore(API_LLM_CONCURRENCY)
+
+_render_pool = None
+
+
+def get_render_pool() -> ProcessPoolExecutor:
+    # Создаётся при первом рендере; spawn, потому что fork процесса с потоками torch небезопасен
+    global _render_pool
+    if _render_pool is None:
+        _render_pool = ProcessPoolExecutor(max_workers=RENDER_POOL_SIZE, mp_context=multiprocessing.get_context("spawn"))
+    return _render_pool
+
+async def run_in_pool(pool, fn, *args, **kwargs):
+    return await asyncio.get_running_loop().run_in_executor(pool, partial(fn, *args, **kwargs))
+
+async def run_model(fn, *args, **kwargs):
+    return await run_in_pool(model_pool, fn, *args, **kwargs)
+
+async def run_io(fn, *args, **kwargs):
+    return await run_in_pool(io_pool, fn, *args, **kwargs)
+
+async def run_render(fn, *args, **kwargs):
+    # fn и аргументы передаются в другой процесс, поэтому должны сериализоваться pickle
+    return await run_in_pool(get_render_pool(), fn, *args, **kwargs)
+
+def create_http_client(**kwargs):
+    # httpx, в отличие от requests, сам по редиректам не ходит
+    import httpx
+
+    return httpx.AsyncClient(verify=False, timeout=HTTP_TIMEOUT, follow_redirects=True,
+                             max_redirects=HTTP_MAX_REDIRECTS, **kwargs)
+
+def shutdown_pools():
+    model_pool.shutdown(wait=False, cancel_futures=True)
+    io_pool.shutdown(wait=False, cancel_futures=True)
+    if _render_pool is not None:
+        _render_pool.shutdown(wait=False, cancel_futures=True)
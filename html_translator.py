@@ -0,0 +1,98 @@
+# html_translator.py
+# Перевод HTML-ответа с сохранением разметки: все текстовые узлы переводятся
+# несколькими пакетными запросами (JSON с пронумерованными фрагментами) вместо запроса на узел.
+import json
+import os
+from bs4 import BeautifulSoup, Comment, Doctype
+from search_and_respond import chat_completion
+from llm_dispatcher import get_dispatcher, estimate_tokens
+from translation_cache import get_translation_cache
+from kazakh_translator import TRANSLATION_MODEL
+
+HTML_BATCH_CHARS = int(os.getenv("HTML_BATCH_CHARS", "6000"))  # символов текста в одном запросе
+HTML_BATCH_SEGMENTS = 60  # фрагментов в одном запросе
+SKIP_TAGS = ("script", "style")
+
+
+def batch_prompt(target_lang: str) -> str:
+    return (
+        f"Ты профессиональный переводчик. Тебе дан JSON-объект: ключи — номера фрагментов, значения — текст. "
+        f"Переведи каждое значение на {target_lang}, сохрани стиль, не добавляй пояснений и не объединяй фрагменты. "
+        f"Верни только JSON-объект с теми же ключами."
+    )
+
+def make_batches(segments: list) -> list:
+    batches = []
+    current = []
+    length = 0
+    for segment in segments:
+        if current and (length + len(segment) > HTML_BATCH_CHARS or len(current) >= HTML_BATCH_SEGMENTS):
+            batches.append(current)
+            current, length = [], 0
+        current.append(segment)
+        length += len(segment)
+    if current:
+        batches.append(current)
+    return batches
+
+def translate_batch(batch: list, target_lang: str) -> dict:
+    payload = json.dumps({str(i): segment for i, segment in enumerate(batch, 1)}, ensure_ascii=False)
+    response = chat_completion(batch_prompt(target_lang), payload, temperature=0, model_open_ai=TRANSLATION_MODEL)
+    parsed = json.loads(response)
+    return {segment: parsed[str(i)] for i, segment in enumerate(batch, 1) if isinstance(parsed.get(str(i)), str)}
+
+def translate_single(segment: str, target_lang: str) -> str:
+    prompt = f"Переведи следующий текст на {target_lang}.\n\nСохрани стиль, но не добавляй пояснений, только перевод\n{segment}"
+    return chat_completion("Ты профессиональный переводчик", prompt, temperature=0, model_open_ai=TRANSLATION_MODEL)
+
+def translate_segments(segments: list, target_lang: str) -> dict:
+    """
+    Возвращает {фрагмент: перевод}. Пакеты отправляются параллельно через llm_dispatcher,
+    переводы фрагментов кэшируются; фрагменты, потерянные в ответе пакета, переводятся по одному.
+    """
+    segments = list(dict.fromkeys(segments))
+    cache = get_translation_cache()
+    model = f"{TRANSLATION_MODEL}:html:{target_lang}"  # та же модель, что в запросах translate_batch и translate_single
+    translations = cache.get_many(segments, model)
+    misses = [segment for segment in segments if segment not in translations]
+
+    dispatcher = get_dispatcher()
+    batches = make_batches(misses)
+    results = dispatcher.map(lambda batch: translate_batch(batch, target_lang), batches,
+                             tokens=lambda batch: 2 * estimate_tokens(*batch), return_exceptions=True)
+    for batch, result in zip(batches, results):
+        if isinstance(result, Exception):
+            print(f"⚠️ Ошибка пакетного перевода ({len(batch)} фрагментов): {result}")
+        else:
+            translations.update(result)
+
+    missing = [segment for segment in misses if segment not in translations]
+    for segment, result in zip(missing, dispatcher.map(lambda s: translate_single(s, target_lang), missing,
+                                                       tokens=lambda s: 2 * estimate_tokens(s),
+                                                       return_exceptions=True)):
+        if isinstance(result, Exception):
+            print(f"⚠️ Ошибка при переводе фрагмента: {result}")
+        else:
+            translations[segment] = result
+
+    for segment in misses:
+        if segment in translations:
+            cache.put(segment, model, translations[segment])
+    return translations
+
+def translate_html(html: str, target_lang: str) -> str:
+    soup = BeautifulSoup(html, "html.parser")
+    nodes = [
+        node for node in soup.find_all(string=True)
+        if node.strip() and not isinstance(node, (Comment, Doctype)) and node.parent.name not in SKIP_TAGS
+    ]
+    translations = translate_segments([node.strip() for node in nodes], target_lang)
+
+    for node in nodes:
+        # Пробелы вокруг текста узла сохраняются, чтобы не склеивать соседние теги
+        original = str(node)
+        text = original.strip()
+        leading = original[:len(original) - len(original.lstrip())]
+        trailing = original[len(original.rstrip()):]
+        node.replace_with(leading + translations.get(text, text) + trailing)
+    return str(soup)
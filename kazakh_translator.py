@@ -1,4 +1,25 @@
-from search_and_respond import query_openai
+import os
+import re
+import threading
+from search_and_respond import chat_completion
+from llm_dispatcher import get_dispatcher, estimate_tokens
+from translation_cache import get_translation_cache
+from text_extraction import split_sentences
+
+# openai — GPT через llm_dispatcher; local — deepvk/kazRush-kk-ru на CPU/GPU;
+# local_int8 — та же модель с динамической int8-квантизацией; onnx — экспорт в ONNX Runtime
+TRANSLATOR_BACKEND = os.getenv("TRANSLATOR_BACKEND", "openai")
+TRANSLATOR_BACKENDS = ("openai", "local", "local_int8", "onnx")
+TRANSLATION_MODEL = os.getenv("TRANSLATION_MODEL", "gpt-4o")
+LOCAL_TRANSLATION_MODEL = os.getenv("LOCAL_TRANSLATION_MODEL", "deepvk/kazRush-kk-ru")
+LOCAL_TRANSLATOR_ONNX_DIR = os.getenv("LOCAL_TRANSLATOR_ONNX_DIR", "models/kazRush-kk-ru-onnx")
+LOCAL_TRANSLATOR_BATCH_SIZE = int(os.getenv("LOCAL_TRANSLATOR_BATCH_SIZE", "16"))  # предложений за один generate
+LOCAL_TRANSLATOR_NUM_BEAMS = int(os.getenv("LOCAL_TRANSLATOR_NUM_BEAMS", "2"))
+# Длиннее — режется по запятым и тире, затем по словам: модель обучена на предложениях,
+# а вход сверх max_length токенизатор обрезал бы молча
+LOCAL_TRANSLATOR_MAX_TOKENS = int(os.getenv("LOCAL_TRANSLATOR_MAX_TOKENS", "200"))
+OUTPUT_TOKENS_RATIO = 2.0  # max_new_tokens на токен входа: русский перевод длиннее казахского оригинала
+SYSTEM_PROMPT = "Ты профессиональный переводчик. Переводи текст с казахского на русский язык точно и грамотно, без добавления лишней информации."
 
 
 def is_probably_kazakh(text: str) -> bool:
@@ -8,9 +29,166 @@ def is_probably_kazakh(text: str) -> bool:
     kazakh_chars = "әғқңөұүһі"
     return any(char in text.lower() for char in kazakh_chars)
 
+def needs_translation(text: str) -> bool:
+    return len(text) >= 5 and is_probably_kazakh(text)
+
+def request_translation(text: str) -> str:
+    prompt = f"Переведи следующий текст с казахского на русский:\n\n{text}"
+    return chat_completion(SYSTEM_PROMPT, prompt, temperature=0, model_open_ai=TRANSLATION_MODEL)
+
+def translation_tokens(text: str) -> int:
+    # Перевод примерно равен исходному тексту по длине: запрос + ответ
+    return 2 * estimate_tokens(text)
+
+
+class OpenAITranslator:
+    def __init__(self):
+        self.name = TRANSLATION_MODEL  # часть ключа кэша переводов
+
+    def translate(self, texts: list) -> list:
+        # На месте неудавшегося перевода — исключение
+        return get_dispatcher().map(request_translation, texts, tokens=translation_tokens, return_exceptions=True)
+
+
+class LocalTranslator:
+    """
+    Seq2seq-модель kazRush: тексты режутся на предложения, предложения всех текстов
+    переводятся пачками, отсортированными по длине, чтобы паддинг был минимальным.
+    """
+
+    def __init__(self, backend: str = "local"):
+        from transformers import AutoTokenizer
+
+        self.name = f"{LOCAL_TRANSLATION_MODEL}:{backend}:beams{LOCAL_TRANSLATOR_NUM_BEAMS}"
+        self.tokenizer = AutoTokenizer.from_pretrained(LOCAL_TRANSLATION_MODEL)
+        self.lock = threading.Lock()  # generate из нескольких потоков только конкурирует за ядра
+        print(f"🔍 Загрузка переводчика {LOCAL_TRANSLATION_MODEL} ({backend})")
+        if backend == "onnx":
+            self.model, self.device = self.load_onnx(), "cpu"
+        else:
+            import torch
+            from transformers import AutoModelForSeq2SeqLM
+
+            self.device = "cuda" if torch.cuda.is_available() and backend == "local" else "cpu"
+            self.model = AutoModelForSeq2SeqLM.from_pretrained(LOCAL_TRANSLATION_MODEL).to(self.device).eval()
+            if backend == "local_int8":
+                # Веса Linear-слоёв в int8, активации квантуются на лету — только CPU
+                self.model = torch.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    def load_onnx(self):
+        from optimum.onnxruntime import ORTModelForSeq2SeqLM
+
+        if os.path.isdir(LOCAL_TRANSLATOR_ONNX_DIR):
+            return ORTModelForSeq2SeqLM.from_pretrained(LOCAL_TRANSLATOR_ONNX_DIR)
+        print(f"🔧 Экспорт {LOCAL_TRANSLATION_MODEL} в ONNX: {LOCAL_TRANSLATOR_ONNX_DIR}")
+        model = ORTModelForSeq2SeqLM.from_pretrained(LOCAL_TRANSLATION_MODEL, export=True)
+        model.save_pretrained(LOCAL_TRANSLATOR_ONNX_DIR)
+        return model
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.tokenizer(text, add_special_tokens=False)["input_ids"])
+
+    def split_long(self, sentence: str) -> list:
+        """
+        Части предложения не длиннее LOCAL_TRANSLATOR_MAX_TOKENS токенов: сначала по границам
+        частей предложения (запятая, точка с запятой, двоеточие, тире), слишком длинная часть — по словам.
+        """
+        if self.count_tokens(sentence) <= LOCAL_TRANSLATOR_MAX_TOKENS:
+            return [sentence]
+        units = []
+        for clause in re.split(r"(?<=[,;:])\s+|\s+(?=[—–]\s)", sentence):
+            units.extend([clause] if self.count_tokens(clause) <= LOCAL_TRANSLATOR_MAX_TOKENS else clause.split())
+
+        pieces, current = [], ""
+        for unit in units:
+            candidate = f"{current} {unit}".strip()
+            if current and self.count_tokens(candidate) > LOCAL_TRANSLATOR_MAX_TOKENS:
+                pieces.append(current)
+                candidate = unit
+            current = candidate
+        if current:
+            pieces.append(current)
+        return pieces
+
+    def translate_sentences(self, sentences: list) -> list:
+        import torch
+
+        order = sorted(range(len(sentences)), key=lambda i: len(sentences[i]))
+        results = [None] * len(sentences)
+        for start in range(0, len(order), LOCAL_TRANSLATOR_BATCH_SIZE):
+            batch = order[start:start + LOCAL_TRANSLATOR_BATCH_SIZE]
+            inputs = self.tokenizer([sentences[i] for i in batch], return_tensors="pt", padding=True,
+                                    truncation=True, max_length=512).to(self.device)
+            # Предел длины перевода — по самому длинному входу пачки, а не общий для всех
+            max_new_tokens = int(inputs["input_ids"].shape[1] * OUTPUT_TOKENS_RATIO) + 16
+            with self.lock, torch.no_grad():
+                outputs = self.model.generate(
+                    **inputs,
+                    num_beams=LOCAL_TRANSLATOR_NUM_BEAMS,
+                    max_new_tokens=max_new_tokens,
+                    no_repeat_ngram_size=3,
+                    early_stopping=True
+                )
+            for i, translated in zip(batch, self.tokenizer.batch_decode(outputs, skip_special_tokens=True)):
+                results[i] = translated
+        return results
+
+    def translate(self, texts: list) -> list:
+        sentences_per_text = [[piece for sentence in split_sentences(text) for piece in self.split_long(sentence)]
+                              for text in texts]
+        try:
+            translated = self.translate_sentences([s for sentences in sentences_per_text for s in sentences])
+        except Exception as e:
+            return [e] * len(texts)
+        results = []
+        offset = 0
+        for sentences in sentences_per_text:
+            results.append(" ".join(translated[offset:offset + len(sentences)]))
+            offset += len(sentences)
+        return results
+
+
+_translator = None
+_translator_lock = threading.Lock()
+
+def create_translator(backend: str = TRANSLATOR_BACKEND):
+    if backend not in TRANSLATOR_BACKENDS:
+        raise ValueError(f"Неизвестный TRANSLATOR_BACKEND: {backend}")
+    return OpenAITranslator() if backend == "openai" else LocalTranslator(backend)
+
+def get_translator():
+    global _translator
+    with _translator_lock:
+        if _translator is None:
+            _translator = create_translator()
+        return _translator
+
+def translate_many(texts: list) -> list:
+    """
+    Перевод списка текстов выбранным TRANSLATOR_BACKEND, порядок сохраняется.
+    Уже переведённые тексты берутся из кэша, одинаковые тексты переводятся один раз.
+    Тексты не на казахском и тексты, перевод которых не удался, возвращаются без изменений.
+    """
+    results = [text.strip() for text in texts]
+    pending = list(dict.fromkeys(text for text in results if needs_translation(text)))
+    if not pending:
+        return results
+
+    translator = get_translator()
+    cache = get_translation_cache()
+    translations = cache.get_many(pending, translator.name)
+    misses = [text for text in pending if text not in translations]
+    for text, result in zip(misses, translator.translate(misses) if misses else []):
+        if isinstance(result, Exception):
+            print(f"⚠️ Ошибка при переводе: {result}")
+        else:
+            cache.put(text, translator.name, result)
+            translations[text] = result
+    return [translations.get(text, text) for text in results]
+
 def translate_kazakh_to_russian(text: str) -> str:
     """
-    Перевод текста с казахского на русский с помощью GPT (OpenAI API).
+    Перевод текста с казахского на русский выбранным TRANSLATOR_BACKEND.
     Если текст не на казахском — возвращает его без изменений.
     """
     text = text.strip()
@@ -21,63 +199,6 @@ def translate_kazakh_to_russian(text: str) -> str:
         print("⏭️ Текст не похож на казахский, перевод не требуется.")
         return text
 
-    system_prompt = "Ты профессиональный переводчик. Переводи текст с казахского на русский язык точно и грамотно, без добавления лишней информации."
-    prompt = f"Переведи следующий текст с казахского на русский:\n\n{text}"
+    translated_text = translate_many([text])[0]
     print("🔁 Перевод выполнен.")
-    translated_text = query_openai(system_prompt, prompt, temperature=0)
     return translated_text
-
-
-# from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
-# import torch
-# import re
-
-# # Настройка устройства
-# device = 'cuda' if torch.cuda.is_available() else 'cpu'
-
-# # Загрузка модели и токенизатора один раз при импорте модуля
-# model_name = 'deepvk/kazRush-kk-ru'
-# model = AutoModelForSeq2SeqLM.from_pretrained(model_name).to(device)
-# tokenizer = AutoTokenizer.from_pretrained(model_name)
-
-# def split_sentences(text: str) -> list[str]:
-#     """
-#     Простая разбивка текста на предложения.
-#     """
-#     # Заменяем ! ? на . и разбиваем по точке
-#     text = re.sub(r'[!?]', '.', text)
-#     return [s.strip() for s in text.split('.') if s.strip()]
-
-# def translate_kazakh_to_russian(text: str) -> str:
-#     """
-#     Перевод текста с казахского на русский по предложениям (без nltk).
-#     """
-#     if not text or len(text.strip()) < 5:
-#         return text
-
-#     sentences = split_sentences(text)
-#     translated_sentences = []
-
-#     for sentence in sentences:
-#         try:
-#             inputs = tokenizer(sentence, return_tensors='pt', truncation=True, max_length=512).to(device)
-#             with torch.no_grad():
-#                 outputs = model.generate(
-#                     **inputs,
-#                     num_beams=5,
-#                     max_new_tokens=128,
-#                     no_repeat_ngram_size=3,
-#                     early_stopping=True
-#                 )
-#             translated = tokenizer.decode(outputs[0], skip_special_tokens=True)
-#             translated_sentences.append(translated)
-#         except Exception as e:
-#             print(f"⚠️ Ошибка в предложении:\n{sentence}\n{e}")
-#             translated_sentences.append(sentence)
-
-#     return " ".join(translated_sentences)
-
-# if __name__ == "__main__":
-#     sample_text = "Қазақстан — Шығыс Еуропа мен Орталық Азияда орналасқан мемлекет. Ол бай табиғи ресурстарға ие."
-#     translated = translate_kazakh_to_russian(sample_text)
-#     print("➡ Перевод:", translated)
@@ -0,0 +1,109 @@
+# llm_dispatcher.py
+# Параллельные вызовы LLM с ограничением числа одновременных запросов,
+# лимитом токенов в минуту и повторами с экспоненциальной задержкой.
+# Для проверки без OpenAI: python stub_llm_server.py и OPENAI_BASE_URL=http://127.0.0.1:8001/v1
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import openai
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", "200000"))  # 0 — без лимита
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "5"))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "1.0"))  # секунды, удваивается с каждой попыткой
+
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.APIConnectionError, openai.APITimeoutError, openai.InternalServerError)
+
+
+def estimate_tokens(*texts: str) -> int:
+    # Грубая оценка для лимита: около трёх символов кириллицы на токен
+    return sum(len(t) for t in texts) // 3 + 1
+
+
+class TokenBucket:
+    """
+    Лимит токенов в минуту: ведро ёмкостью в минутный лимит, пополняется равномерно.
+    """
+
+    def __init__(self, tokens_per_minute: int):
+        self.capacity = tokens_per_minute
+        self.available = float(tokens_per_minute)
+        self.rate = tokens_per_minute / 60.0
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens: int):
+        if self.capacity <= 0:
+            return
+        tokens = min(tokens, self.capacity)
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.available >= tokens:
+                    self.available -= tokens
+                    return
+                wait = (tokens - self.available) / self.rate
+            time.sleep(wait)
+
+
+class LLMDispatcher:
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY, tokens_per_minute: int = LLM_TOKENS_PER_MINUTE,
+                 max_retries: int = LLM_MAX_RETRIES, base_delay: float = LLM_RETRY_BASE_DELAY):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.bucket = TokenBucket(tokens_per_minute)
+        self.semaphore = threading.BoundedSemaphore(max_concurrency)
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="llm")
+
+    def call(self, fn, *args, tokens: int = 0, **kwargs):
+        """
+        Синхронный вызов в текущем потоке с учётом лимитов и повторов.
+        """
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire(tokens)
+            try:
+                with self.semaphore:
+                    return fn(*args, **kwargs)
+            except RETRYABLE_ERRORS as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self.base_delay * 2 ** attempt * (1 + random.random())
+                print(f"⏳ Ошибка LLM ({type(e).__name__}), повтор через {delay:.1f} с")
+                time.sleep(delay)
+
+    def submit(self, fn, *args, tokens: int = 0, **kwargs):
+        return self.executor.submit(self.call, fn, *args, tokens=tokens, **kwargs)
+
+    def map(self, fn, items, tokens=estimate_tokens, return_exceptions: bool = False) -> list:
+        """
+        Вызывает fn(item) для каждого элемента параллельно, результаты — в порядке items.
+        При return_exceptions=True исключение возвращается на месте результата.
+        """
+        futures = [self.submit(fn, item, tokens=tokens(item)) for item in items]
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                if not return_exceptions:
+                    raise
+                results.append(e)
+        return results
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+def get_dispatcher() -> LLMDispatcher:
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = LLMDispatcher()
+        return _dispatcher
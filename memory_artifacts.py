@@ -0,0 +1,60 @@
+# memory_artifacts.py
+# Короткоживущее хранилище сгенерированных PDF/DOCX в памяти процесса API:
+# файл отдаётся по /artifacts/{id} без записи в answers/.
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+load_dotenv()
+
+MEMORY_ARTIFACTS_MAX_MB = int(os.getenv("MEMORY_ARTIFACTS_MAX_MB", "64"))
+MEMORY_ARTIFACTS_TTL = int(os.getenv("MEMORY_ARTIFACTS_TTL", "600"))  # секунды
+
+
+class MemoryArtifacts:
+    """
+    LRU по суммарному размеру с TTL. Как и статусы заданий рендеринга, живёт в памяти
+    одного процесса: за файлом нужно обращаться к тому же процессу API.
+    """
+
+    def __init__(self, max_bytes: int = MEMORY_ARTIFACTS_MAX_MB * 1024 * 1024, ttl: int = MEMORY_ARTIFACTS_TTL):
+        self.items = OrderedDict()
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+
+    def put(self, data: bytes, media_type: str, filename: str) -> str:
+        artifact_id = uuid.uuid4().hex
+        with self.lock:
+            self.items[artifact_id] = {
+                "data": data,
+                "media_type": media_type,
+                "filename": filename,
+                "expires": time.time() + self.ttl
+            }
+            self.total_bytes += len(data)
+            self._evict()
+        return artifact_id
+
+    def get(self, artifact_id: str):
+        with self.lock:
+            self._evict()
+            item = self.items.get(artifact_id)
+            if item is not None:
+                self.items.move_to_end(artifact_id)
+            return item
+
+    def _evict(self):
+        now = time.time()
+        for artifact_id in [i for i, item in self.items.items() if item["expires"] < now]:
+            self.total_bytes -= len(self.items.pop(artifact_id)["data"])
+        while self.total_bytes > self.max_bytes and self.items:
+            _, item = self.items.popitem(last=False)
+            self.total_bytes -= len(item["data"])
+
+
+memory_artifacts = MemoryArtifacts()
@@ -0,0 +1,224 @@
+# meta_store.py
+import json
+import sqlite3
+import threading
+from pathlib import Path
+
+META_DB_PATH = "faiss_index/meta.db"
+META_JSON_PATH = "faiss_index/meta.json"  # старый формат, импортируется один раз
+MMAP_SIZE = 1 << 30  # SQLite читает файл через mmap, страницы не копируются в кучу процесса
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,            -- id вектора в summary_index.faiss
+    source TEXT NOT NULL UNIQUE,
+    title TEXT,
+    summary TEXT
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    id INTEGER PRIMARY KEY,            -- id вектора в index.faiss
+    doc_id INTEGER NOT NULL REFERENCES documents(id),
+    document TEXT,
+    text TEXT,
+    hash TEXT,
+    chunk_length INTEGER,
+    preview TEXT,
+    date TEXT,
+    topic TEXT,
+    lang TEXT
+);
+CREATE INDEX IF NOT EXISTS chunks_doc_id ON chunks(doc_id);
+CREATE TABLE IF NOT EXISTS files (     -- манифест проиндексированных файлов
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    content_hash TEXT NOT NULL,
+    doc_id INTEGER
+);
+CREATE TABLE IF NOT EXISTS counters (  -- следующий свободный id: id удалённых векторов не переиспользуются
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+CHUNK_COLUMNS = ("id", "doc_id", "document", "text", "hash", "chunk_length", "preview", "date", "topic", "lang")
+
+
+def group_documents(metadata: list) -> list:
+    # Таблица документов из старого meta.json: одна запись на источник и id его чанков
+    documents = []
+    doc_by_source = {}
+    for chunk_id, item in enumerate(metadata):
+        source = item.get("source")
+        if source not in doc_by_source:
+            doc_by_source[source] = len(documents)
+            documents.append({
+                "source": source,
+                "title": item.get("title", ""),
+                "summary": item.get("context_text", ""),
+                "chunk_ids": []
+            })
+        documents[doc_by_source[source]]["chunk_ids"].append(chunk_id)
+    return documents
+
+
+class MetaStore:
+    """
+    Метаданные чанков и документов в SQLite. Поиск читает только строки
+    с найденными id, а build_index.py дописывает новые строки, не переписывая файл.
+    """
+
+    def __init__(self, path: str = META_DB_PATH, readonly: bool = False):
+        self.path = path
+        self.readonly = readonly
+        self._local = threading.local()
+        if not readonly:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self.conn.executescript(SCHEMA)
+
+    @property
+    def conn(self):
+        # Отдельное соединение на поток: FastAPI выполняет обработчики в разных потоках
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            if self.readonly:
+                conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+            else:
+                conn = sqlite3.connect(self.path)
+            conn.row_factory = sqlite3.Row
+            conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+            self._local.conn = conn
+        return conn
+
+    def commit(self):
+        self.conn.commit()
+
+    # === Чтение ===
+    def chunk_count(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def document_count(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def get_chunks(self, ids) -> list:
+        """
+        Чанки в формате записей старого meta.json, в порядке переданных id.
+        Отсутствующие id пропускаются.
+        """
+        ids = [int(i) for i in ids]
+        if not ids:
+            return []
+        placeholders = ",".join("?" * len(ids))
+        rows = self.conn.execute(
+            f"SELECT c.*, d.source, d.title, d.summary AS context_text "
+            f"FROM chunks c JOIN documents d ON d.id = c.doc_id WHERE c.id IN ({placeholders})",
+            ids
+        ).fetchall()
+        by_id = {row["id"]: dict(row) for row in rows}
+        return [by_id[i] for i in ids if i in by_id]
+
+    def document_chunk_ids(self, doc_ids) -> dict:
+        doc_ids = [int(i) for i in doc_ids]
+        result = {doc_id: [] for doc_id in doc_ids}
+        if not doc_ids:
+            return result
+        placeholders = ",".join("?" * len(doc_ids))
+        rows = self.conn.execute(
+            f"SELECT id, doc_id FROM chunks WHERE doc_id IN ({placeholders}) ORDER BY id", doc_ids
+        )
+        for chunk_id, doc_id in rows:
+            result[doc_id].append(chunk_id)
+        return result
+
+    def chunk_doc_ids(self, chunk_ids) -> dict:
+        chunk_ids = [int(i) for i in chunk_ids]
+        if not chunk_ids:
+            return {}
+        placeholders = ",".join("?" * len(chunk_ids))
+        rows = self.conn.execute(f"SELECT id, doc_id FROM chunks WHERE id IN ({placeholders})", chunk_ids)
+        return dict(rows.fetchall())
+
+    def document_id(self, source: str):
+        row = self.conn.execute("SELECT id FROM documents WHERE source = ?", (source,)).fetchone()
+        return row[0] if row else None
+
+    def iter_documents(self):
+        for row in self.conn.execute("SELECT id, source, title, summary FROM documents ORDER BY id"):
+            yield dict(row)
+
+    def iter_chunk_texts(self):
+        for chunk_id, text in self.conn.execute("SELECT id, text FROM chunks ORDER BY id"):
+            yield chunk_id, text
+
+    def get_file(self, path: str):
+        row = self.conn.execute("SELECT * FROM files WHERE path = ?", (path,)).fetchone()
+        return dict(row) if row else None
+
+    def iter_files(self):
+        for row in self.conn.execute("SELECT * FROM files").fetchall():
+            yield dict(row)
+
+    # === Запись (build_index.py) ===
+    def allocate_ids(self, table: str, count: int) -> list:
+        if table not in ("chunks", "documents"):
+            raise ValueError(f"Неизвестная таблица: {table}")
+        row = self.conn.execute("SELECT value FROM counters WHERE name = ?", (table,)).fetchone()
+        start = row[0] if row else self.conn.execute(f"SELECT COALESCE(MAX(id), -1) + 1 FROM {table}").fetchone()[0]
+        self.conn.execute(
+            "INSERT INTO counters (name, value) VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET value = excluded.value",
+            (table, start + count)
+        )
+        return list(range(start, start + count))
+
+    def upsert_file(self, path: str, size: int, mtime: float, content_hash: str, doc_id):
+        self.conn.execute(
+            "INSERT INTO files (path, size, mtime, content_hash, doc_id) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(path) DO UPDATE SET size = excluded.size, mtime = excluded.mtime, "
+            "content_hash = excluded.content_hash, doc_id = excluded.doc_id",
+            (path, size, mtime, content_hash, doc_id)
+        )
+
+    def delete_file(self, path: str):
+        self.conn.execute("DELETE FROM files WHERE path = ?", (path,))
+
+    def remove_document(self, doc_id: int) -> list:
+        """
+        Удаляет документ и его чанки, возвращает id удалённых чанков.
+        """
+        chunk_ids = self.document_chunk_ids([doc_id])[doc_id]
+        self.conn.execute("DELETE FROM chunks WHERE doc_id = ?", (doc_id,))
+        self.conn.execute("DELETE FROM documents WHERE id = ?", (doc_id,))
+        return chunk_ids
+
+    def add_document(self, doc_id: int, source: str, title: str, summary: str):
+        self.conn.execute(
+            "INSERT INTO documents (id, source, title, summary) VALUES (?, ?, ?, ?)",
+            (doc_id, source, title, summary)
+        )
+
+    def add_chunks(self, items: list):
+        self.conn.executemany(
+            f"INSERT INTO chunks ({', '.join(CHUNK_COLUMNS)}) VALUES ({', '.join('?' * len(CHUNK_COLUMNS))})",
+            [tuple(item.get(column) for column in CHUNK_COLUMNS) for item in items]
+        )
+
+    def import_metadata(self, metadata: list):
+        # id чанка — его позиция в meta.json (= строка в index.faiss), id документа — порядок появления
+        for doc_id, doc in enumerate(group_documents(metadata)):
+            self.add_document(doc_id, doc["source"], doc["title"], doc["summary"])
+            self.add_chunks([dict(metadata[c], id=c, doc_id=doc_id) for c in doc["chunk_ids"]])
+        self.commit()
+
+
+def open_meta_store(path: str = META_DB_PATH, readonly: bool = False) -> MetaStore:
+    """
+    Открывает хранилище; при первом запуске переносит данные из meta.json.
+    """
+    if not Path(path).exists() and Path(META_JSON_PATH).exists():
+        print(f"🔧 Перенос {META_JSON_PATH} в {path}...")
+        with open(META_JSON_PATH, encoding="utf-8") as f:
+            metadata = json.load(f)
+        MetaStore(path).import_metadata(metadata)
+    if readonly and not Path(path).exists():
+        MetaStore(path)  # пустая база со схемой
+    return MetaStore(path, readonly=readonly)
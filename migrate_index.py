@@ -0,0 +1,70 @@
+import argparse
+import os
+import shutil
+import faiss
+from pathlib import Path
+from vector_index import (INDEX_TYPE, INDEX_TYPES, METRIC, METRICS, STORAGE, STORAGE_CODES,
+                          build_index_from_vectors, extract_vectors)
+from meta_store import META_DB_PATH, open_meta_store
+from embeddings import embedding_config, load_embedder, save_embedding_config
+
+INDEX_PATH = "faiss_index/index.faiss"
+SUMMARY_INDEX_PATH = "faiss_index/summary_index.faiss"
+
+
+def reencode_texts(path: str):
+    # id и тексты, из которых в build_index.py получены векторы соответствующего индекса
+    from search_and_respond import build_summary_text
+
+    meta_store = open_meta_store(META_DB_PATH, readonly=True)
+    if path == INDEX_PATH:
+        rows = list(meta_store.iter_chunk_texts())
+    else:
+        rows = [(d["id"], build_summary_text(d)) for d in meta_store.iter_documents()]
+    return [i for i, _ in rows], [text for _, text in rows]
+
+
+def migrate(path: str, index_type: str, metric: str, storage: str, model=None):
+    old_index = faiss.read_index(path)
+    print(f"🔧 {path}: {type(old_index).__name__}, {old_index.ntotal} векторов")
+
+    if model is not None:
+        ids, texts = reencode_texts(path)
+        vectors = model.encode(texts)
+    else:
+        # Для PQ/SQ8-индексов реконструкция приближённая — для точной миграции нужен --reencode
+        ids, vectors = extract_vectors(old_index)
+
+    new_index = build_index_from_vectors(vectors, ids, index_type, metric, storage)
+
+    backup_path = f"{path}.bak"
+    shutil.copyfile(path, backup_path)
+    tmp_path = f"{path}.tmp"
+    faiss.write_index(new_index, tmp_path)
+    os.replace(tmp_path, path)
+    print(f"✅ {path}: {type(new_index).__name__}, резервная копия: {backup_path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Перестроение существующих индексов под новые настройки FAISS")
+    parser.add_argument("--index-type", default=INDEX_TYPE, choices=INDEX_TYPES)
+    parser.add_argument("--metric", default=METRIC, choices=list(METRICS))
+    parser.add_argument("--storage", default=STORAGE, choices=list(STORAGE_CODES))
+    parser.add_argument("--reencode", action="store_true",
+                        help="заново посчитать эмбеддинги по текстам вместо реконструкции из индекса")
+    args = parser.parse_args()
+
+    # При --reencode векторы считаются моделью из .env (EMBEDDING_MODEL, EMBEDDING_BACKEND, EMBEDDING_DIM)
+    embedding = embedding_config()
+    model = load_embedder(embedding) if args.reencode else None
+    for path in (INDEX_PATH, SUMMARY_INDEX_PATH):
+        if Path(path).exists():
+            migrate(path, args.index_type, args.metric, args.storage, model)
+        else:
+            print(f"⚠️ Индекс не найден: {path}")
+    if args.reencode:
+        save_embedding_config(embedding)
+
+
+if __name__ == "__main__":
+    main()
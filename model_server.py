@@ -0,0 +1,196 @@
+# model_server.py
+# Один процесс держит модель эмбеддингов и cross-encoder, воркеры uvicorn обращаются к нему через Unix-сокет.
+#   python model_server.py                 — запуск сервера (сокет из MODEL_SERVER_SOCKET)
+#   MODEL_SERVER_SOCKET=... uvicorn api:app --workers 4  — воркеры под тем же пользователем (ключ в <сокет>.key)
+# Если MODEL_SERVER_SOCKET не задан, search_and_respond.py загружает модели в своём процессе, как раньше.
+import argparse
+import os
+import secrets
+import threading
+import time
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+from dotenv import load_dotenv
+
+load_dotenv()
+
+MODEL_SERVER_SOCKET = os.getenv("MODEL_SERVER_SOCKET", "")
+# Ключ проверки подключения (HMAC в multiprocessing.connection). Соединение передаёт pickle,
+# поэтому ключ обязателен: без MODEL_SERVER_AUTHKEY сервер создаёт случайный ключ и пишет его
+# в файл с правами 0600 рядом с сокетом, клиенты того же пользователя читают его оттуда
+MODEL_SERVER_AUTHKEY = os.getenv("MODEL_SERVER_AUTHKEY", "")
+MODEL_SERVER_CONNECT_TIMEOUT = float(os.getenv("MODEL_SERVER_CONNECT_TIMEOUT", "60"))  # сервер может ещё грузить модели
+INDEX_PATH = "faiss_index/index.faiss"
+SUMMARY_INDEX_PATH = "faiss_index/summary_index.faiss"
+
+
+class ModelServerError(RuntimeError):
+    pass
+
+
+def key_file(address: str) -> str:
+    return f"{address}.key"
+
+def read_authkey(address: str) -> bytes:
+    if MODEL_SERVER_AUTHKEY:
+        return MODEL_SERVER_AUTHKEY.encode("utf-8")
+    with open(key_file(address), "rb") as f:
+        return f.read()
+
+def write_authkey(address: str) -> bytes:
+    if MODEL_SERVER_AUTHKEY:
+        return MODEL_SERVER_AUTHKEY.encode("utf-8")
+    key = secrets.token_bytes(32)
+    tmp_path = f"{key_file(address)}.tmp"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(key)
+    os.replace(tmp_path, key_file(address))
+    return key
+
+
+class ModelServerClient:
+    """
+    Соединение на поток: запросы одного соединения идут по очереди,
+    а потоки model_pool воркера работают с сервером параллельно.
+    """
+
+    def __init__(self, address: str = MODEL_SERVER_SOCKET):
+        self.address = address
+        self._local = threading.local()
+
+    def connect(self):
+        deadline = time.monotonic() + MODEL_SERVER_CONNECT_TIMEOUT
+        while True:
+            try:
+                # Ключ читается при каждом подключении: после перезапуска сервера он новый
+                return Client(self.address, family="AF_UNIX", authkey=read_authkey(self.address))
+            except (FileNotFoundError, ConnectionRefusedError, AuthenticationError):
+                if time.monotonic() > deadline:
+                    raise ModelServerError(f"Сервер моделей не отвечает на {self.address}, запустите model_server.py")
+                time.sleep(0.5)
+
+    def call(self, op: str, *args):
+        for attempt in range(2):
+            conn = getattr(self._local, "conn", None)
+            if conn is None:
+                conn = self._local.conn = self.connect()
+            try:
+                conn.send((op, args))
+                status, result = conn.recv()
+                break
+            except (EOFError, OSError):
+                # Сервер перезапущен: одно переподключение
+                self._local.conn = None
+                conn.close()
+                if attempt:
+                    raise
+        if status == "error":
+            raise ModelServerError(result)
+        return result
+
+
+class RemoteEmbedder:
+    # То, что search_and_respond.py использует у SentenceTransformer
+    def __init__(self, client: ModelServerClient):
+        self.client = client
+
+    def encode(self, texts, **kwargs):
+        return self.client.call("encode", list(texts))
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.client.call("info")["dim"]
+
+
+class RemoteQueryEncoder:
+    # Кэш и сборка запросов в пачки — на сервере, общие для всех воркеров
+    def __init__(self, client: ModelServerClient):
+        self.client = client
+
+    def encode(self, texts: list):
+        return self.client.call("encode_queries", list(texts))
+
+    def stats(self) -> dict:
+        return self.client.call("info")["query_cache"]
+
+
+class RemoteReranker:
+    def __init__(self, client: ModelServerClient):
+        self.client = client
+
+    def score(self, query: str, docs: list):
+        # Серверу нужны только текст и хэш чанка
+        return self.client.call("rerank", query, [{"text": d["text"], "hash": d.get("hash")} for d in docs])
+
+    def stats(self) -> dict:
+        return self.client.call("info")["rerank_cache"]
+
+
+def serve(address: str):
+    from embeddings import embedding_config, embedding_id, load_embedder, check_embedding_config
+    from query_encoder import QueryEncoder
+    from reranking import Reranker
+
+    embedding = embedding_config()
+    if os.path.exists(INDEX_PATH) or os.path.exists(SUMMARY_INDEX_PATH):
+        check_embedding_config(embedding)
+    model = load_embedder(embedding)
+    query_encoder = QueryEncoder(model, embedding_id(embedding))
+    reranker = Reranker()
+
+    ops = {
+        "encode": lambda texts: model.encode(texts, batch_size=64),
+        "encode_queries": query_encoder.encode,
+        "rerank": reranker.score,
+        "info": lambda: {
+            "embedding": embedding,
+            "dim": model.get_sentence_embedding_dimension(),
+            "query_cache": query_encoder.stats(),
+            "rerank_cache": reranker.stats()
+        },
+    }
+
+    def handle(conn):
+        with conn:
+            while True:
+                try:
+                    op, args = conn.recv()
+                except (EOFError, OSError):
+                    return  # воркер закрыл соединение
+                try:
+                    reply = ("ok", ops[op](*args))
+                except Exception as e:
+                    reply = ("error", f"{op}: {type(e).__name__}: {e}")
+                conn.send(reply)
+
+    if os.path.exists(address):
+        os.remove(address)  # сокет от прошлого запуска
+    # umask до bind: сокет сразу создаётся с правами 0600, без окна, когда к нему могут подключиться другие
+    old_umask = os.umask(0o077)
+    try:
+        authkey = write_authkey(address)
+        listener = Listener(address, family="AF_UNIX", authkey=authkey)
+    finally:
+        os.umask(old_umask)
+    print(f"✅ Сервер моделей слушает {address}")
+    try:
+        while True:
+            try:
+                conn = listener.accept()
+            except Exception as e:
+                print(f"⚠️ Отклонено подключение: {e}")
+                continue
+            threading.Thread(target=handle, args=(conn,), daemon=True).start()
+    finally:
+        listener.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Общий процесс с моделями эмбеддингов и rerank для воркеров API")
+    parser.add_argument("--socket", default=MODEL_SERVER_SOCKET or "model_server.sock")
+    args = parser.parse_args()
+    serve(args.socket)
+
+
+if __name__ == "__main__":
+    main()
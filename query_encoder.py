@@ -0,0 +1,183 @@
+# query_encoder.py
+# Эмбеддинги поисковых запросов: LRU в памяти и необязательный кэш на диске по нормализованному тексту,
+# промахи из параллельных запросов собираются в одну пачку и считаются одним проходом модели.
+import hashlib
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from pathlib import Path
+import numpy as np
+from dotenv import load_dotenv
+from translation_cache import normalize_text
+
+load_dotenv()
+
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "4096"))  # векторов в памяти
+QUERY_CACHE_PATH = os.getenv("QUERY_CACHE_PATH", "")           # SQLite-файл; пусто — только память
+QUERY_CACHE_MAX_ROWS = int(os.getenv("QUERY_CACHE_MAX_ROWS", "200000"))
+QUERY_BATCH_WINDOW_MS = float(os.getenv("QUERY_BATCH_WINDOW_MS", "5"))  # сколько ждать попутные запросы
+QUERY_BATCH_SIZE = int(os.getenv("QUERY_BATCH_SIZE", "32"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS query_embeddings (
+    key TEXT PRIMARY KEY,              -- sha256(модель + нормализованный текст)
+    vector BLOB NOT NULL,              -- float32
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS query_embeddings_last_used ON query_embeddings(last_used);
+"""
+
+
+def embedding_key(text: str, model_id: str) -> str:
+    return hashlib.sha256(f"{model_id}\0{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingDiskCache:
+    def __init__(self, path: str, max_rows: int = QUERY_CACHE_MAX_ROWS):
+        self.path = path
+        self.max_rows = max_rows
+        self._local = threading.local()
+        self.puts = 0
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.conn.executescript(SCHEMA)
+
+    @property
+    def conn(self):
+        # Отдельное соединение на поток: читают потоки model_pool, пишет поток пачек
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode = WAL")
+            self._local.conn = conn
+        return conn
+
+    def get_many(self, keys: list) -> dict:
+        found = {}
+        for start in range(0, len(keys), 500):
+            part = keys[start:start + 500]
+            rows = self.conn.execute(
+                f"SELECT key, vector FROM query_embeddings WHERE key IN ({','.join('?' * len(part))})", part
+            ).fetchall()
+            found.update((key, np.frombuffer(vector, dtype=np.float32)) for key, vector in rows)
+        if found:
+            self.conn.executemany("UPDATE query_embeddings SET last_used = ? WHERE key = ?",
+                                  [(time.time(), key) for key in found])
+        return found
+
+    def put_many(self, items: dict):
+        now = time.time()
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO query_embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+            [(key, np.asarray(vector, dtype=np.float32).tobytes(), now) for key, vector in items.items()]
+        )
+        self.puts += len(items)
+        if self.puts >= 1000:
+            # Вытеснение по last_used, не чаще чем раз в тысячу записей
+            self.puts = 0
+            self.conn.execute(
+                "DELETE FROM query_embeddings WHERE key IN "
+                "(SELECT key FROM query_embeddings ORDER BY last_used DESC LIMIT -1 OFFSET ?)", (self.max_rows,)
+            )
+
+
+class QueryEncoder:
+    """
+    encode(texts) — то же, что model.encode(texts), но с кэшем. Промахи уходят в фоновый поток,
+    который ждёт QUERY_BATCH_WINDOW_MS попутных запросов и считает их одним вызовом model.encode.
+    """
+
+    def __init__(self, model, model_id: str, cache_size: int = QUERY_CACHE_SIZE, cache_path: str = QUERY_CACHE_PATH,
+                 batch_window_ms: float = QUERY_BATCH_WINDOW_MS, batch_size: int = QUERY_BATCH_SIZE):
+        self.model = model
+        self.model_id = model_id
+        self.cache = OrderedDict()
+        self.cache_size = cache_size
+        self.disk = EmbeddingDiskCache(cache_path) if cache_path else None
+        self.batch_window = batch_window_ms / 1000
+        self.batch_size = batch_size
+        self.lock = threading.Lock()
+        self.requests = queue.Queue()
+        self.worker = None
+        self.hits = 0
+        self.misses = 0
+        self.batches = 0
+
+    def encode(self, texts: list) -> np.ndarray:
+        normalized = [normalize_text(t) for t in texts]
+        keys = [embedding_key(t, self.model_id) for t in normalized]
+        vectors = {}
+        with self.lock:
+            for key in keys:
+                if key in self.cache:
+                    self.cache.move_to_end(key)
+                    vectors[key] = self.cache[key]
+        missing = [k for k in dict.fromkeys(keys) if k not in vectors]
+        if missing and self.disk is not None:
+            from_disk = self.disk.get_many(missing)
+            vectors.update(from_disk)
+            self.remember(from_disk)
+            missing = [k for k in missing if k not in from_disk]
+
+        with self.lock:
+            self.misses += len(missing)
+            self.hits += len(keys) - len(missing)
+        if missing:
+            text_by_key = dict(zip(keys, normalized))
+            futures = {key: self.submit(text_by_key[key]) for key in missing}
+            computed = {key: future.result() for key, future in futures.items()}
+            vectors.update(computed)
+            self.remember(computed)
+            if self.disk is not None:
+                self.disk.put_many(computed)
+        return np.stack([vectors[key] for key in keys])
+
+    def remember(self, items: dict):
+        with self.lock:
+            for key, vector in items.items():
+                self.cache[key] = vector
+                self.cache.move_to_end(key)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+    def submit(self, text: str) -> Future:
+        future = Future()
+        with self.lock:
+            if self.worker is None:
+                self.worker = threading.Thread(target=self.run_batches, name="query-encoder", daemon=True)
+                self.worker.start()
+        self.requests.put((text, future))
+        return future
+
+    def run_batches(self):
+        while True:
+            batch = [self.requests.get()]
+            deadline = time.monotonic() + self.batch_window
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self.requests.get(timeout=timeout))
+                except queue.Empty:
+                    break
+
+            texts = list(dict.fromkeys(text for text, _ in batch))
+            try:
+                encoded = self.model.encode(texts, batch_size=self.batch_size, convert_to_numpy=True)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            by_text = {text: np.asarray(vector, dtype=np.float32) for text, vector in zip(texts, encoded)}
+            for text, future in batch:
+                future.set_result(by_text[text])
+            with self.lock:
+                self.batches += 1
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self.cache), "batches": self.batches}
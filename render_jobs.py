@@ -0,0 +1,95 @@
+# render_jobs.py
+# Фоновая очередь рендеринга PDF/DOCX: обработчик получает id задания сразу,
+# файл строится в пуле процессов executors и раздаётся из /answers, когда готов.
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from executors import RENDER_POOL_SIZE, run_render
+from artifact_store import touch
+
+ANSWERS_DIR = Path("answers")
+JOBS_HISTORY = 1000  # сколько последних заданий помнит /jobs/{id}
+
+
+class RenderJobs:
+    """
+    Статусы заданий: queued → running → done | failed. Хранятся в памяти процесса API,
+    поэтому /jobs/{id} нужно спрашивать у того же процесса, который принял задание.
+    """
+
+    def __init__(self, workers: int = RENDER_POOL_SIZE, history: int = JOBS_HISTORY):
+        self.jobs = OrderedDict()
+        self.tasks = {}
+        self.active = {}  # имя файла → id задания, которое его строит
+        self.history = history
+        self.workers = workers
+        self._slots = None
+
+    @property
+    def slots(self):
+        # Не больше workers заданий в работе, остальные ждут в статусе queued
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.workers)
+        return self._slots
+
+    def submit(self, render_fn, html: str, filename: str) -> str:
+        """
+        Имена файлов строятся по содержимому (artifact_store.artifact_name): если файл уже есть,
+        задание сразу завершено, а если он строится — возвращается id уже идущего задания.
+        """
+        if filename in self.active:
+            return self.active[filename]
+
+        job_id = uuid.uuid4().hex
+        path = ANSWERS_DIR / filename
+        cached = path.exists()
+        self.jobs[job_id] = {
+            "id": job_id,
+            "status": "done" if cached else "queued",
+            "url": f"/answers/{filename}",
+            "error": None,
+            "created": time.time(),
+            "finished": time.time() if cached else None
+        }
+        if cached:
+            touch(path)
+        else:
+            self.active[filename] = job_id
+            self.tasks[job_id] = asyncio.create_task(self._run(job_id, render_fn, html, filename))
+        while len(self.jobs) > self.history:
+            # Незавершённое задание удаляется только из истории, его задача доработает сама
+            self.jobs.popitem(last=False)
+        return job_id
+
+    async def _run(self, job_id: str, render_fn, html: str, filename: str):
+        job = self.jobs[job_id]
+        try:
+            async with self.slots:
+                job["status"] = "running"
+                await run_render(render_fn, html, filename)
+            # save_html_to_pdf при отсутствии шрифта или шапки только печатает ошибку
+            if not (ANSWERS_DIR / filename).exists():
+                raise RuntimeError("Файл не создан, подробности в логе сервера")
+            job["status"] = "done"
+        except Exception as e:
+            print(f"❌ Ошибка рендеринга {filename}: {e}")
+            job["status"] = "failed"
+            job["error"] = str(e)
+        finally:
+            job["finished"] = time.time()
+            self.tasks.pop(job_id, None)
+            self.active.pop(filename, None)
+
+    def get(self, job_id: str):
+        return self.jobs.get(job_id)
+
+    async def wait(self, job_id: str) -> dict:
+        task = self.tasks.get(job_id)
+        if task is not None:
+            await asyncio.shield(task)
+        return self.jobs[job_id]
+
+
+render_jobs = RenderJobs()
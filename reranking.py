@@ -0,0 +1,131 @@
+# reranking.py
+# Переранжирование cross-encoder'ом: длинный чанк режется на окна по токенам,
+# оценка чанка — лучшее окно; оценки (запрос, чанк) кэшируются; модель — torch, int8 или ONNX.
+import os
+import re
+import threading
+from collections import OrderedDict
+from hashlib import md5
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+RERANKER_MODEL = os.getenv("RERANKER_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANKER_BACKEND = os.getenv("RERANKER_BACKEND", "torch")  # torch | int8 | onnx
+RERANKER_BACKENDS = ("torch", "int8", "onnx")
+# Файл модели в репозитории HF для backend=onnx; onnx/model_qint8_avx512.onnx — int8-вариант ONNX
+RERANKER_ONNX_FILE = os.getenv("RERANKER_ONNX_FILE", "onnx/model.onnx")
+RERANK_MAX_WINDOWS = int(os.getenv("RERANK_MAX_WINDOWS", "3"))  # окон одного чанка, которые оцениваются моделью
+RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", "20000"))
+RERANK_BATCH_SIZE = 32
+WINDOW_OVERLAP = 0.25  # доля перекрытия соседних окон
+
+
+def normalize_query(query: str) -> str:
+    return re.sub(r"\s+", " ", query).strip().lower()
+
+def words(text: str) -> set:
+    return set(re.findall(r"\w{3,}", text.lower()))
+
+
+class Reranker:
+    """
+    score(query, docs) — оценки релевантности чанков (dict с text и hash) запросу.
+    Ключ кэша — нормализованный запрос и md5 текста чанка (поле hash в meta_store).
+    """
+
+    def __init__(self, model_name: str = RERANKER_MODEL, backend: str = RERANKER_BACKEND,
+                 max_windows: int = RERANK_MAX_WINDOWS, cache_size: int = RERANK_CACHE_SIZE):
+        if backend not in RERANKER_BACKENDS:
+            raise ValueError(f"Неизвестный RERANKER_BACKEND: {backend}")
+        print(f"🔍 Загрузка cross-encoder для rerank ({backend})...")
+        self.model = load_cross_encoder(model_name, backend)
+        self.tokenizer = self.model.tokenizer
+        self.max_length = self.model.max_length or self.tokenizer.model_max_length
+        self.max_windows = max_windows
+        self.cache = OrderedDict()
+        self.cache_size = cache_size
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def passage_windows(self, query: str, text: str) -> list:
+        """
+        Окна текста, каждое из которых вместе с запросом помещается в max_length токенов.
+        Если окон больше max_windows, берутся первое и окна с наибольшим пересечением слов с запросом.
+        """
+        query_tokens = len(self.tokenizer(query, add_special_tokens=False)["input_ids"])
+        budget = max(32, self.max_length - query_tokens - 3)  # [CLS] запрос [SEP] окно [SEP]
+        offsets = self.tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)["offset_mapping"]
+        if len(offsets) <= budget:
+            return [text]
+
+        step = max(1, int(budget * (1 - WINDOW_OVERLAP)))
+        windows = []
+        for start in range(0, len(offsets), step):
+            end = min(start + budget, len(offsets))
+            windows.append(text[offsets[start][0]:offsets[end - 1][1]])
+            if end == len(offsets):
+                break
+        if len(windows) <= self.max_windows:
+            return windows
+
+        query_words = words(query)
+        ranked = sorted(range(1, len(windows)), key=lambda i: len(query_words & words(windows[i])), reverse=True)
+        return [windows[0]] + [windows[i] for i in sorted(ranked[:self.max_windows - 1])]
+
+    def score(self, query: str, docs: list) -> np.ndarray:
+        normalized = normalize_query(query)
+        keys = [(normalized, doc.get("hash") or md5(doc["text"].encode()).hexdigest()) for doc in docs]
+        scores = np.zeros(len(docs), dtype=np.float32)
+
+        missing = []
+        with self.lock:
+            for i, key in enumerate(keys):
+                if key in self.cache:
+                    self.cache.move_to_end(key)
+                    scores[i] = self.cache[key]
+                else:
+                    missing.append(i)
+            self.hits += len(docs) - len(missing)
+            self.misses += len(missing)
+        if not missing:
+            return scores
+
+        pairs, owners = [], []
+        for i in missing:
+            for window in self.passage_windows(query, docs[i]["text"]):
+                pairs.append((query, window))
+                owners.append(i)
+        window_scores = self.model.predict(pairs, batch_size=RERANK_BATCH_SIZE, show_progress_bar=False)
+
+        best = {}
+        for i, value in zip(owners, window_scores):
+            best[i] = max(best.get(i, -np.inf), float(value))
+        with self.lock:
+            for i in missing:
+                scores[i] = best[i]
+                self.cache[keys[i]] = best[i]
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return scores
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self.cache)}
+
+
+def load_cross_encoder(model_name: str, backend: str):
+    from sentence_transformers import CrossEncoder
+
+    if backend == "onnx":
+        # ONNX Runtime на CPU (sentence-transformers >= 4 с extras [onnx])
+        return CrossEncoder(model_name, backend="onnx", model_kwargs={"file_name": RERANKER_ONNX_FILE})
+    model = CrossEncoder(model_name)
+    if backend == "int8":
+        import torch
+
+        # Динамическая квантизация Linear-слоёв: веса int8, только CPU
+        model.model = torch.quantization.quantize_dynamic(model.model, {torch.nn.Linear}, dtype=torch.qint8)
+    return model
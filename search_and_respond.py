@@ -1,55 +1,159 @@
-import fitz
 import json
 import faiss
+import threading
+from functools import wraps
 from pathlib import Path
 from difflib import SequenceMatcher
-from sentence_transformers import SentenceTransformer, CrossEncoder
 
-import requests
-from utils import save_html_to_pdf, save_to_docx
-from openai import OpenAI
 import os
 from dotenv import load_dotenv
 from topic_utils import infer_topic
+from vector_index import read_index, build_index_from_vectors, search_index
+from meta_store import META_DB_PATH, open_meta_store
+from executors import llm_semaphore, run_io
+from embeddings import embedding_config, embedding_id, load_embedder, check_embedding_config
+from model_server import MODEL_SERVER_SOCKET, ModelServerClient, RemoteEmbedder, RemoteQueryEncoder, RemoteReranker
+from reranking import Reranker
+from query_encoder import QueryEncoder
 load_dotenv()
 SUMMARY_CACHE_PATH = "faiss_index/summary_cache.json"
 # === Настройки ===
 INDEX_PATH = "faiss_index/index.faiss"
-META_PATH = "faiss_index/meta.json"
+SUMMARY_INDEX_PATH = "faiss_index/summary_index.faiss"
 REQUESTS_DIR = Path("requests")
 TOP_K = 4
-MODEL_NAME = "mixedbread-ai/mxbai-embed-large-v1" # модель для поиска
-
-client = OpenAI()
-
-# Загрузка данных из файла в словарь
-with open(SUMMARY_CACHE_PATH, "r", encoding="utf-8") as f:
-    summary_cache = json.load(f)
+RRF_K = 60  # сглаживающая константа reciprocal rank fusion
+EMBEDDING = embedding_config()  # модель для поиска, backend и размерность из .env
+
+# === Ленивая загрузка ===
+# Клиенты OpenAI, модели и индексы создаются при первом обращении: build_index.py, переводчики
+# и скрипты, которым нужен только chat_completion, импортируют модуль без загрузки моделей.
+# API загружает всё заранее через warm_up() при старте.
+_loaded = {}
+_load_lock = threading.RLock()
+
+
+def lazy(loader):
+    @wraps(loader)
+    def get():
+        if loader.__name__ not in _loaded:
+            with _load_lock:
+                if loader.__name__ not in _loaded:
+                    _loaded[loader.__name__] = loader()
+        return _loaded[loader.__name__]
+    return get
+
+
+@lazy
+def get_client():
+    # openai импортируется здесь: сам импорт занимает около трети секунды
+    from openai import OpenAI
+    return OpenAI()
+
+@lazy
+def get_async_client():
+    # для обработчиков api.py, не блокирует цикл событий
+    from openai import AsyncOpenAI
+    return AsyncOpenAI()
+
+@lazy
+def get_summary_cache() -> dict:
+    # Заголовки документов для fragments_list; без файла ответы строятся без заголовков
+    if not Path(SUMMARY_CACHE_PATH).exists():
+        print(f"⚠️ {SUMMARY_CACHE_PATH} не найден, заголовки фрагментов будут пустыми. Запустите build_index.py.")
+        return {}
+    with open(SUMMARY_CACHE_PATH, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+@lazy
+def get_model_server():
+    # Модели держит model_server.py, воркер только отправляет запросы через Unix-сокет
+    return ModelServerClient(MODEL_SERVER_SOCKET)
 
 # === Загрузка модели и индекса ===
-def load_model():
-    print(f"🔍 Загрузка модели эмбеддингов: {MODEL_NAME}")
-    return SentenceTransformer(MODEL_NAME)
-def load_reranker():
-    print("🔍 Загрузка cross-encoder для rerank...")
-    return CrossEncoder("cross-encoder/ms-marco-MiniLM-L-6-v2")
-
-reranker = load_reranker()
-model = load_model()
-if Path(INDEX_PATH).exists():
-    index = faiss.read_index(INDEX_PATH)
-else:
-    index = faiss.IndexFlatL2(1024)  # или 768, если другая модель
-
-if Path(META_PATH).exists():
-    with open(META_PATH, encoding="utf-8") as f:
-        metadata = json.load(f)
-else:
-    print("⚠️ META файл не найден, создаётся пустой список.")
-    metadata = []
+@lazy
+def get_model():
+    if MODEL_SERVER_SOCKET:
+        return RemoteEmbedder(get_model_server())
+    if Path(INDEX_PATH).exists() or Path(SUMMARY_INDEX_PATH).exists():
+        check_embedding_config(EMBEDDING)
+    return load_embedder(EMBEDDING)
+
+@lazy
+def get_query_encoder():
+    # эмбеддинги запросов с кэшем и сборкой в пачки
+    if MODEL_SERVER_SOCKET:
+        return RemoteQueryEncoder(get_model_server())
+    return QueryEncoder(get_model(), embedding_id(EMBEDDING))
+
+@lazy
+def get_reranker():
+    if MODEL_SERVER_SOCKET:
+        return RemoteReranker(get_model_server())
+    return Reranker()
+
+@lazy
+def get_index():
+    if Path(INDEX_PATH).exists():
+        return read_index(INDEX_PATH)
+    return faiss.IndexFlatL2(get_model().get_sentence_embedding_dimension())
+
+@lazy
+def get_meta_store():
+    # Метаданные читаются из SQLite по id найденных векторов, в память целиком не загружаются
+    return open_meta_store(META_DB_PATH, readonly=True)
+
+def build_summary_text(item: dict) -> str:
+    # Строка "заголовок. краткое содержание", по которой ищет search_by_title_summary
+    return f"{item.get('title', '')}. {item.get('summary', item.get('context_text', ''))}".strip()
+
+@lazy
+def get_summary_index():
+    # Индекс выжимок строится в build_index.py, id вектора — id документа в meta_store
+    meta_store = get_meta_store()
+    document_count = meta_store.document_count()
+    if Path(SUMMARY_INDEX_PATH).exists():
+        summary_index = read_index(SUMMARY_INDEX_PATH)
+        if summary_index.ntotal == document_count:
+            return summary_index
+        print("⚠️ Индекс выжимок не совпадает с META, пересоздаётся в памяти. Запустите build_index.py.")
+    elif document_count:
+        print("⚠️ Индекс выжимок не найден, создаётся в памяти. Запустите build_index.py.")
+
+    if not document_count:
+        return faiss.IndexFlatL2(get_model().get_sentence_embedding_dimension())
+    documents = list(meta_store.iter_documents())
+    vectors = get_model().encode([build_summary_text(d) for d in documents])
+    return build_index_from_vectors(vectors, [d["id"] for d in documents])
+
+def warm_up():
+    # Всё, что нужно поиску и ответам, загружается до первого запроса (startup в api.py)
+    for get in (get_client, get_async_client, get_summary_cache, get_reranker, get_query_encoder,
+                get_index, get_meta_store, get_summary_index):
+        get()
+
+# Прежние глобальные имена модуля (model, index, ...) — теперь загружаются при первом обращении
+LAZY_ATTRIBUTES = {
+    "client": get_client,
+    "async_client": get_async_client,
+    "summary_cache": get_summary_cache,
+    "model": get_model,
+    "query_encoder": get_query_encoder,
+    "reranker": get_reranker,
+    "index": get_index,
+    "meta_store": get_meta_store,
+    "summary_index": get_summary_index,
+}
+
+def __getattr__(name):
+    if name in LAZY_ATTRIBUTES:
+        return LAZY_ATTRIBUTES[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # === Вспомогательные функции ===
 def extract_text_from_pdf(path):
+    import fitz  # PyMuPDF нужен только api.py, не скриптам индексации
+
     doc = fitz.open(path)
     return "\n".join(page.get_text() for page in doc)
 
@@ -65,34 +169,76 @@ def filter_similar_chunks(ranked_docs, threshold=0.85):
             filtered.append(doc)
     return filtered
 
-def search_by_title_summary(title_query: str, top_k=TOP_K, score_threshold=0.5):
-    # Комбинируем заголовок и краткое содержание
-    combined_texts = [
-        f"{m.get('title', '')}. {m.get('summary', '')}".strip()
-        for m in metadata
-    ]
+def search_documents(title_query: str, top_k=TOP_K):
+    # Поиск по индексу выжимок, результат — id документов в meta_store
+    query_vector = get_query_encoder().encode([title_query])
+    distances, indices = search_index(get_summary_index(), query_vector, top_k)
+    return [int(i) for i in indices[0] if i >= 0]
 
-    # Эмбеддинг запроса и документов
-    doc_vectors = model.encode(combined_texts)
-    query_vector = model.encode([title_query])
+def search_chunks(query_text: str, top_k=TOP_K * 4):
+    # Поиск по индексу чанков index.faiss, результат — id чанков в meta_store
+    index = get_index()
+    if index.ntotal == 0:
+        return []
+    query_vector = get_query_encoder().encode([query_text])
+    distances, indices = search_index(index, query_vector, top_k)
+    return [int(i) for i in indices[0] if i >= 0]
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    scores = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
+
+def rerank_best_per_document(query: str, chunk_ids, score_threshold=0.5):
+    retrieved = get_meta_store().get_chunks(chunk_ids)
+    if not retrieved:
+        return []
 
-    # Временный FAISS-индекс и поиск
-    temp_index = faiss.IndexFlatL2(doc_vectors.shape[1])
-    temp_index.add(doc_vectors)
-    distances, indices = temp_index.search(query_vector, top_k)
+    scores = get_reranker().score(query, retrieved)
 
-    # Собираем найденные документы
-    retrieved = [metadata[i] for i in indices[0] if i < len(metadata)]
+    # Один лучший чанк на документ, чтобы документ не занимал несколько мест в top_k
+    best_by_source = {}
+    for doc, score in zip(retrieved, scores):
+        source = doc.get("source")
+        if score >= score_threshold and (source not in best_by_source or score > best_by_source[source][1]):
+            best_by_source[source] = (doc, score)
+    ranked = sorted(best_by_source.values(), key=lambda x: x[1], reverse=True)
 
-    # Подготовка пар для ранжирования
-    pairs = [(title_query, doc["text"]) for doc in retrieved]
-    scores = reranker.predict(pairs)
+    return [doc for doc, _ in ranked]
 
-    # Привязываем score к документам и фильтруем
-    scored_docs = [(doc, score) for doc, score in zip(retrieved, scores) if score >= score_threshold]
-    ranked = sorted(scored_docs, key=lambda x: x[1], reverse=True)
+def search_by_title_summary(title_query: str, top_k=TOP_K, score_threshold=0.5):
+    # Кандидаты для ранжирования — чанки найденных документов
+    chunks_by_doc = get_meta_store().document_chunk_ids(search_documents(title_query, top_k))
+    chunk_ids = [c for doc_chunks in chunks_by_doc.values() for c in doc_chunks]
+    return rerank_best_per_document(title_query, chunk_ids, score_threshold)
+
+def search_hybrid(title_query: str, request_text: str, top_k=TOP_K, score_threshold=0.5):
+    """
+    Объединяет поиск по выжимкам (по теме запроса) и поиск по чанкам (по тексту запроса)
+    через reciprocal rank fusion на уровне документов.
+    """
+    # Оба запроса кодируются одной пачкой, дальше search_documents и search_chunks берут векторы из кэша
+    get_query_encoder().encode([title_query, request_text] if request_text.strip() else [title_query])
+    summary_hits = search_documents(title_query, top_k * 2)
+    chunk_hits = search_chunks(request_text, top_k * 4) if request_text.strip() else []
+
+    meta_store = get_meta_store()
+    doc_by_chunk = meta_store.chunk_doc_ids(chunk_hits)
+    hit_chunks_by_doc = {}
+    for c in chunk_hits:
+        if c in doc_by_chunk:
+            hit_chunks_by_doc.setdefault(doc_by_chunk[c], []).append(c)
+    chunk_doc_hits = list(hit_chunks_by_doc)  # порядок — по первому найденному чанку
+
+    fused_docs = reciprocal_rank_fusion([summary_hits, chunk_doc_hits])[:top_k]
+
+    # Для документов из чанкового поиска ранжируем найденные чанки, для остальных — все чанки документа
+    all_chunks_by_doc = meta_store.document_chunk_ids([d for d in fused_docs if d not in hit_chunks_by_doc])
+    chunk_ids = [c for doc_id in fused_docs for c in hit_chunks_by_doc.get(doc_id) or all_chunks_by_doc.get(doc_id, [])]
+    return rerank_best_per_document(title_query, chunk_ids, score_threshold)
 
-    return [doc for doc, _ in ranked]
 # def search_by_title_summary(title_query: str, top_k=TOP_K):
 #     # Комбинируем заголовок и краткое содержание
 #     combined_texts = [
@@ -160,8 +306,7 @@ def rerank_results(query, retrieved, threshold=0.5):
     if not retrieved:
         return []
 
-    pairs = [(query, doc["text"]) for doc in retrieved]
-    scores = reranker.predict(pairs)
+    scores = get_reranker().score(query, retrieved)
 
     # Привязываем score к каждому документу
     scored_docs = list(zip(retrieved, scores))
@@ -175,6 +320,8 @@ def rerank_results(query, retrieved, threshold=0.5):
     return [doc for doc, _ in ranked]
 
 def query_ollama(prompt, model_ollama="mistral:instruct"):
+    import requests
+
     try:
         response = requests.post(
             "http://localhost:11434/api/generate",
@@ -185,9 +332,21 @@ def query_ollama(prompt, model_ollama="mistral:instruct"):
     except Exception as e:
         return f"[Ошибка подключения к Ollama: {e}]"
 
-def query_openai(system_prompt: str, prompt: str, temperature: int = 1, model_open_ai: str = "gpt-4o") -> str:
-    try:
-        response = client.chat.completions.create(
+def chat_completion(system_prompt: str, prompt: str, temperature: int = 1, model_open_ai: str = "gpt-4o") -> str:
+    # Вызов без перехвата ошибок: llm_dispatcher повторяет запрос при 429/5xx/таймаутах
+    response = get_client().chat.completions.create(
+        model=model_open_ai,
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": prompt}
+        ],
+        temperature=temperature,
+    )
+    return clean_completion(response.choices[0].message.content)
+
+async def chat_completion_async(system_prompt: str, prompt: str, temperature: int = 1, model_open_ai: str = "gpt-4o") -> str:
+    async with llm_semaphore:
+        response = await get_async_client().chat.completions.create(
             model=model_open_ai,
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -195,28 +354,54 @@ def query_openai(system_prompt: str, prompt: str, temperature: int = 1, model_op
             ],
             temperature=temperature,
         )
-        content = response.choices[0].message.content.strip()
+    return clean_completion(response.choices[0].message.content)
 
-        # 🔍 Удаляем обёртки ```json и ```
-        if content.startswith("```json") or content.startswith("```"):
-            content = content.replace("```json", "").replace("```", "").strip()
+async def stream_chat_completion(system_prompt: str, prompt: str, temperature: int = 1, model_open_ai: str = "gpt-4o"):
+    # Асинхронный генератор фрагментов ответа по мере их генерации
+    async with llm_semaphore:
+        stream = await get_async_client().chat.completions.create(
+            model=model_open_ai,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=temperature,
+            stream=True,
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
 
-        # ✂️ Удаляем пояснение в начале, если оно есть
-        for prefix in [
-            "html",
-        ]:
-            if content.startswith(prefix):
-                content = content[len(prefix):].strip()
-                break  # только первую подходящую строку удаляем
+def clean_completion(content: str) -> str:
+    content = content.strip()
 
-        return content
+    # 🔍 Удаляем обёртки ```json и ```
+    if content.startswith("```json") or content.startswith("```"):
+        content = content.replace("```json", "").replace("```", "").strip()
 
+    # ✂️ Удаляем пояснение в начале, если оно есть
+    for prefix in [
+        "html",
+    ]:
+        if content.startswith(prefix):
+            content = content[len(prefix):].strip()
+            break  # только первую подходящую строку удаляем
+
+    return content
+
+def query_openai(system_prompt: str, prompt: str, temperature: int = 1, model_open_ai: str = "gpt-4o") -> str:
+    try:
+        return chat_completion(system_prompt, prompt, temperature, model_open_ai)
     except Exception as e:
         return f"[Ошибка OpenAI: {e}]"
 
-def generate_answer(request_text, similar_docs, system_prompt: str, lang: str = "Русский", use_openai=False):
-
+async def query_openai_async(system_prompt: str, prompt: str, temperature: int = 1, model_open_ai: str = "gpt-4o") -> str:
+    try:
+        return await chat_completion_async(system_prompt, prompt, temperature, model_open_ai)
+    except Exception as e:
+        return f"[Ошибка OpenAI: {e}]"
 
+def build_answer_prompt(request_text, similar_docs):
     shortened_docs = []
     fragments_list = []
     for i, doc in enumerate(similar_docs):
@@ -232,7 +417,7 @@ def generate_answer(request_text, similar_docs, system_prompt: str, lang: str =
         shortened_docs.append(f"[Фрагмент {i+1} — источник: {doc['source']}]\n{context}")
 
         source = doc.get("source")
-        summary_entry = summary_cache.get(source)
+        summary_entry = get_summary_cache().get(source)
 
         title = summary_entry.get("title") if isinstance(summary_entry, dict) else None
 
@@ -259,7 +444,10 @@ def generate_answer(request_text, similar_docs, system_prompt: str, lang: str =
 
     print("\n📤 Промпт, отправленный в LLM:\n")
     print(prompt)
+    return prompt, fragments_list
 
+def generate_answer(request_text, similar_docs, system_prompt: str, lang: str = "Русский", use_openai=False):
+    prompt, fragments_list = build_answer_prompt(request_text, similar_docs)
     if use_openai:
         return {
             "ai_answer": query_openai(system_prompt, prompt+f"""Ответ переведи на язык: {lang}"""),
@@ -270,3 +458,14 @@ def generate_answer(request_text, similar_docs, system_prompt: str, lang: str =
             "ai_answer": query_ollama(system_prompt, prompt+f"""Ответ переведи на язык: {lang}"""),
             "fragments_list": fragments_list
         }
+
+async def generate_answer_async(request_text, similar_docs, system_prompt: str, lang: str = "Русский", use_openai=False):
+    prompt, fragments_list = build_answer_prompt(request_text, similar_docs)
+    if use_openai:
+        ai_answer = await query_openai_async(system_prompt, prompt+f"""Ответ переведи на язык: {lang}""")
+    else:
+        ai_answer = await run_io(query_ollama, system_prompt, prompt+f"""Ответ переведи на язык: {lang}""")
+    return {
+        "ai_answer": ai_answer,
+        "fragments_list": fragments_list
+    }
@@ -0,0 +1,90 @@
+# stub_llm_server.py
+# Локальная заглушка OpenAI Chat Completions для проверки llm_dispatcher и build_index.py без сети:
+#   python stub_llm_server.py --latency 0.5 --fail-rate 0.2
+#   OPENAI_BASE_URL=http://127.0.0.1:8001/v1 OPENAI_API_KEY=stub python build_index.py
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+stats = {"requests": 0, "failed": 0, "active": 0, "max_active": 0}
+stats_lock = threading.Lock()
+
+
+def make_reply(messages: list) -> str:
+    system_prompt = messages[0]["content"] if messages else ""
+    prompt = messages[-1]["content"] if messages else ""
+    if prompt.startswith("{"):
+        # Пакетный перевод фрагментов: возвращаем тот же JSON с номерами
+        return prompt
+    if "JSON" in system_prompt:
+        return json.dumps({"title": prompt[:60].strip(), "summary": prompt[:400].strip()}, ensure_ascii=False)
+    # Перевод: возвращаем исходный текст после заголовка запроса
+    return prompt.split("\n\n", 1)[-1]
+
+
+class Handler(BaseHTTPRequestHandler):
+    latency = 0.0
+    fail_rate = 0.0
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        with stats_lock:
+            stats["requests"] += 1
+            stats["active"] += 1
+            stats["max_active"] = max(stats["max_active"], stats["active"])
+        try:
+            time.sleep(self.latency)
+            if random.random() < self.fail_rate:
+                with stats_lock:
+                    stats["failed"] += 1
+                self.send_json(429, {"error": {"message": "Rate limit reached (stub)", "type": "rate_limit_error"}})
+                return
+            content = make_reply(body.get("messages", []))
+            self.send_json(200, {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", "stub"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+            })
+        finally:
+            with stats_lock:
+                stats["active"] -= 1
+
+    def send_json(self, status: int, payload: dict):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Заглушка OpenAI API для локальной проверки")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=0.2, help="задержка ответа, с")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="доля ответов 429")
+    args = parser.parse_args()
+
+    Handler.latency = args.latency
+    Handler.fail_rate = args.fail_rate
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), Handler)
+    print(f"🧪 Заглушка LLM: http://127.0.0.1:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(f"📊 Запросов: {stats['requests']}, ответов 429: {stats['failed']}, "
+          f"одновременно максимум: {stats['max_active']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+import os
+from hashlib import md5
+import numpy as np
+import pytest
+import build_index
+from build_index import IndexWriter, find_changed_files
+from vector_index import extract_vectors
+
+
+class FakeEmbedder:
+    # Детерминированные векторы по тексту вместо модели
+    def encode(self, texts, **kwargs):
+        return np.array([np.frombuffer(md5(t.encode()).digest(), dtype="uint8")[:8] for t in texts], dtype="float32")
+
+
+@pytest.fixture
+def corpus(tmp_path, monkeypatch):
+    # Пути индекса и meta.db относительные — каждый тест работает в своём каталоге
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(build_index, "summary_cache", {})
+    (tmp_path / "pdfs").mkdir()
+    (tmp_path / "faiss_index").mkdir()
+    for name in ("a", "b", "c"):
+        write(tmp_path / "pdfs" / f"{name}.pdf", f"документ {name}")
+    return tmp_path / "pdfs"
+
+
+def write(path, text: str, mtime: float = 1_700_000_000):
+    path.write_text(text, encoding="utf-8")
+    os.utime(path, (mtime, mtime))
+
+
+def files(pdf_dir) -> list:
+    return sorted(pdf_dir.iterdir())
+
+
+def run(pdf_dir):
+    # Проход build_index.main без извлечения текста и LLM: чанки — строки файла
+    model = FakeEmbedder()
+    writer = IndexWriter(model)
+    changed = find_changed_files(writer, files(pdf_dir))
+    for file, stat, content_hash in changed:
+        chunks = [f"{line} {i}" for i, line in enumerate(file.read_text(encoding="utf-8").split(";"))]
+        doc = {"file": file, "stat": stat, "content_hash": content_hash, "chunks": chunks,
+               "summary": {"title": file.stem, "summary": chunks[0]}}
+        summary_text = build_index.build_summary_text(doc["summary"])
+        writer.add_document(doc, model.encode(chunks), model.encode([summary_text]))
+    writer.save()
+    return writer, [file.name for file, _, _ in changed]
+
+
+def assert_consistent(writer):
+    meta_store = writer.meta_store
+    chunk_ids = {row[0] for row in meta_store.conn.execute("SELECT id FROM chunks")}
+    doc_ids = {d["id"] for d in meta_store.iter_documents()}
+    assert set(extract_vectors(writer.index)[0].tolist()) == chunk_ids
+    assert set(extract_vectors(writer.summary_index)[0].tolist()) == doc_ids
+    assert writer.index.ntotal == meta_store.chunk_count()
+    assert writer.summary_index.ntotal == meta_store.document_count()
+    assert {f["doc_id"] for f in meta_store.iter_files()} == doc_ids
+
+
+def test_first_run_indexes_everything(corpus):
+    writer, changed = run(corpus)
+    assert changed == ["a.pdf", "b.pdf", "c.pdf"]
+    assert writer.meta_store.document_count() == 3
+    assert_consistent(writer)
+
+
+def test_unchanged_files_are_skipped(corpus):
+    run(corpus)
+    writer, changed = run(corpus)
+    assert changed == []
+    assert_consistent(writer)
+
+
+def test_touched_file_is_checked_by_hash(corpus):
+    run(corpus)
+    path = corpus / "a.pdf"
+    os.utime(path, (1_800_000_000, 1_800_000_000))
+    writer, changed = run(corpus)
+    assert changed == []
+    # Новое mtime запомнено: в следующий раз файл даже не хэшируется
+    assert writer.meta_store.get_file(str(path))["mtime"] == 1_800_000_000
+
+
+def test_modified_file_is_reindexed(corpus):
+    writer, _ = run(corpus)
+    old_doc_id = writer.meta_store.get_file(str(corpus / "b.pdf"))["doc_id"]
+    old_chunk_ids = writer.meta_store.document_chunk_ids([old_doc_id])[old_doc_id]
+
+    write(corpus / "b.pdf", "новый текст;второй чанк;третий чанк", mtime=1_800_000_000)
+    writer, changed = run(corpus)
+    assert changed == ["b.pdf"]
+    new_doc_id = writer.meta_store.get_file(str(corpus / "b.pdf"))["doc_id"]
+    assert new_doc_id != old_doc_id
+    assert len(writer.meta_store.document_chunk_ids([new_doc_id])[new_doc_id]) == 3
+    assert writer.meta_store.get_chunks(old_chunk_ids) == []
+    assert writer.meta_store.document_count() == 3
+    assert_consistent(writer)
+
+
+def test_deleted_file_is_removed(corpus):
+    run(corpus)
+    (corpus / "c.pdf").unlink()
+    writer, changed = run(corpus)
+    assert changed == []
+    assert writer.meta_store.get_file(str(corpus / "c.pdf")) is None
+    assert writer.meta_store.document_id("c.pdf") is None
+    assert writer.meta_store.document_count() == 2
+    assert_consistent(writer)
+
+
+def test_legacy_document_is_adopted(corpus):
+    writer, _ = run(corpus)
+    # Индекс, построенный до манифеста: документ есть, строки в files нет
+    doc_id = writer.meta_store.document_id("a.pdf")
+    writer.meta_store.delete_file(str(corpus / "a.pdf"))
+    writer.meta_store.commit()
+
+    writer, changed = run(corpus)
+    assert changed == []
+    assert writer.meta_store.get_file(str(corpus / "a.pdf"))["doc_id"] == doc_id
+    assert_consistent(writer)
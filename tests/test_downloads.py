@@ -0,0 +1,65 @@
+import asyncio
+import httpx
+import pytest
+from executors import create_http_client
+from uploads import UploadError, check_magic, download_to_file
+
+PDF = b"%PDF-1.4\n" + b"0" * 1000 + b"\n%%EOF"
+
+
+def storage_handler(request: httpx.Request) -> httpx.Response:
+    # Ссылка хранилища перенаправляет на CDN, как у реальных file_url
+    if request.url.path == "/share/1":
+        return httpx.Response(302, headers={"location": "https://cdn.example.com/files/1.pdf"})
+    if request.url.path == "/loop":
+        return httpx.Response(302, headers={"location": "https://storage.example.com/loop"})
+    return httpx.Response(200, content=PDF)
+
+
+def download(url: str, path):
+    async def run():
+        async with create_http_client(transport=httpx.MockTransport(storage_handler)) as client:
+            return await download_to_file(client, url, path, "pdf")
+    return asyncio.run(run())
+
+
+def test_download_follows_redirect(tmp_path):
+    path = tmp_path / "request.pdf"
+    assert download("https://storage.example.com/share/1", path) == len(PDF)
+    assert path.read_bytes() == PDF
+
+
+def test_download_stops_on_redirect_loop(tmp_path):
+    with pytest.raises(UploadError) as error:
+        download("https://storage.example.com/loop", tmp_path / "request.pdf")
+    assert error.value.status_code == 502
+
+
+def test_download_accepts_pdf_header_after_junk(tmp_path):
+    # Заголовок не с нулевого байта, а ответ приходит частями короче 1024 байт
+    content = b"\r\n" * 100 + PDF
+
+    class SmallChunks(httpx.AsyncByteStream):
+        async def __aiter__(self):
+            for start in range(0, len(content), 100):
+                yield content[start:start + 100]
+
+    def handler(request):
+        return httpx.Response(200, stream=SmallChunks())
+
+    async def run():
+        async with create_http_client(transport=httpx.MockTransport(handler)) as client:
+            return await download_to_file(client, "https://storage.example.com/1.pdf", path, "pdf")
+
+    path = tmp_path / "request.pdf"
+    assert asyncio.run(run()) == len(content)
+    assert path.read_bytes() == content
+
+
+def test_check_magic_search_limit():
+    with pytest.raises(UploadError) as error:
+        check_magic("pdf", b" " * 1024 + PDF)
+    assert error.value.status_code == 415
+    check_magic("pdf", b" " * 1000 + PDF)
+    with pytest.raises(UploadError):
+        check_magic("docx", b" " + b"PK\x03\x04")
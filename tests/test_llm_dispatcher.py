@@ -0,0 +1,104 @@
+import threading
+import time
+import httpx
+import openai
+import pytest
+from llm_dispatcher import LLMDispatcher, TokenBucket
+
+
+def connection_error():
+    return openai.APIConnectionError(request=httpx.Request("POST", "https://api.openai.com/v1/chat/completions"))
+
+
+class FlakyClient:
+    # Первые failures вызовов для каждого текста падают с error, потом ответ приходит
+    def __init__(self, failures: int, error=connection_error):
+        self.failures = failures
+        self.error = error
+        self.calls = {}
+        self.lock = threading.Lock()
+
+    def complete(self, text: str) -> str:
+        with self.lock:
+            self.calls[text] = self.calls.get(text, 0) + 1
+            attempt = self.calls[text]
+        # Поздние элементы отвечают раньше ранних, порядок результатов от этого не зависит
+        time.sleep(0.001 * (10 - len(text) % 10))
+        if attempt <= self.failures:
+            raise self.error()
+        return text.upper()
+
+
+def dispatcher(**kwargs) -> LLMDispatcher:
+    kwargs.setdefault("tokens_per_minute", 0)
+    return LLMDispatcher(max_concurrency=4, base_delay=0, **kwargs)
+
+
+def test_map_keeps_input_order():
+    items = [f"текст {'x' * i}" for i in range(20)]
+    assert dispatcher().map(FlakyClient(0).complete, items) == [item.upper() for item in items]
+
+
+def test_call_retries_retryable_errors():
+    client = FlakyClient(3)
+    assert dispatcher(max_retries=5).call(client.complete, "текст") == "ТЕКСТ"
+    assert client.calls["текст"] == 4
+
+
+def test_call_gives_up_after_max_retries():
+    client = FlakyClient(10)
+    with pytest.raises(openai.APIConnectionError):
+        dispatcher(max_retries=2).call(client.complete, "текст")
+    assert client.calls["текст"] == 3
+
+
+def test_call_does_not_retry_other_errors():
+    client = FlakyClient(1, error=ValueError)
+    with pytest.raises(ValueError):
+        dispatcher().call(client.complete, "текст")
+    assert client.calls["текст"] == 1
+
+
+def test_map_retries_each_item_and_keeps_order():
+    client = FlakyClient(2)
+    items = ["а", "бб", "ввв", "гггг", "ддддд"]
+    assert dispatcher(max_retries=3).map(client.complete, items) == [item.upper() for item in items]
+    assert all(calls == 3 for calls in client.calls.values())
+
+
+def test_map_returns_exceptions_in_place():
+    def complete(text):
+        if text == "плохой":
+            raise ValueError(text)
+        return text
+
+    results = dispatcher().map(complete, ["один", "плохой", "три"], return_exceptions=True)
+    assert results[0] == "один" and results[2] == "три"
+    assert isinstance(results[1], ValueError)
+
+
+def test_call_waits_for_tokens():
+    # 6000 токенов в минуту — 100 в секунду; ведро опустошено, 20 токенов набираются за 0.2 с
+    d = dispatcher(tokens_per_minute=6000)
+    d.bucket.available = 0
+    d.bucket.updated = time.monotonic()
+    started = time.monotonic()
+    assert d.call(str.upper, "текст", tokens=20) == "ТЕКСТ"
+    assert 0.15 <= time.monotonic() - started < 1
+
+
+def test_token_bucket_spends_capacity_without_waiting():
+    bucket = TokenBucket(6000)
+    started = time.monotonic()
+    bucket.acquire(3000)
+    bucket.acquire(3000)
+    assert time.monotonic() - started < 0.1
+    assert bucket.available < 100
+
+
+def test_token_bucket_without_limit():
+    bucket = TokenBucket(0)
+    started = time.monotonic()
+    for _ in range(100):
+        bucket.acquire(10 ** 6)
+    assert time.monotonic() - started < 0.1
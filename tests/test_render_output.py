@@ -0,0 +1,31 @@
+import zipfile
+import pytest
+from utils import save_to_docx, write_atomically
+
+
+def test_failed_render_leaves_no_file(tmp_path):
+    output = tmp_path / "answer.pdf"
+
+    def crash(path):
+        with open(path, "wb") as f:
+            f.write(b"%PDF-1.4 truncated")
+        raise RuntimeError("процесс рендеринга упал")
+
+    with pytest.raises(RuntimeError):
+        write_atomically(str(output), crash)
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_existing_file_is_replaced_whole(tmp_path):
+    output = tmp_path / "answer.pdf"
+    output.write_bytes(b"old")
+    write_atomically(str(output), lambda path: open(path, "wb").write(b"new"))
+    assert output.read_bytes() == b"new"
+    assert list(tmp_path.iterdir()) == [output]
+
+
+def test_save_to_docx_writes_complete_file(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    save_to_docx("Первый абзац\n\nВторой абзац", "answer.docx")
+    assert [p.name for p in (tmp_path / "answers").iterdir()] == ["answer.docx"]
+    assert zipfile.is_zipfile(tmp_path / "answers" / "answer.docx")
@@ -0,0 +1,69 @@
+from api import SOURCE_TAG_WINDOW, SourceTagParser, clean_html_code_block, extract_source_and_clean_text
+
+
+def stream(deltas: list):
+    # Как /generate-request/stream: события source — по new_source, token — всё, что отдал парсер
+    parser = SourceTagParser()
+    tokens, sources = [], []
+    for delta in deltas + [None]:
+        text = parser.feed(delta) if delta is not None else parser.flush()
+        if parser.new_source:
+            parser.new_source = False
+            sources.append(parser.source)
+        tokens.append(text)
+    assert "".join(tokens) == parser.text
+    return tokens, sources, parser
+
+
+def pieces(text: str, size: int) -> list:
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def test_tag_split_across_deltas():
+    tokens, sources, parser = stream(["[Ист", "очник: ", '"Закон', ' о пенсиях.pdf"]', "\n<p>Текст</p>"])
+    assert tokens[:3] == ["", "", ""]  # до конца тега ничего не отдаётся
+    assert sources == ["Закон о пенсиях.pdf"]
+    assert parser.text == "\n<p>Текст</p>"
+
+
+def test_no_tag_in_short_answer():
+    tokens, sources, parser = stream(["<p>Коротко", "</p>"])
+    assert tokens == ["", "", "<p>Коротко</p>"]
+    assert sources == [None]
+
+
+def test_no_tag_in_long_answer_is_released_after_window():
+    answer = "<p>" + "текст " * 100 + "</p>"
+    tokens, sources, parser = stream(pieces(answer, 20))
+    assert any(tokens[:-1])  # отдаётся по ходу генерации, а не в конце
+    assert sources == [None]
+    assert parser.text == answer
+
+
+def test_tag_inside_html_fence():
+    tokens, sources, parser = stream(["```html\n", "[Источник: ", "a.pdf]", "\n<p>Текст</p>\n```"])
+    assert sources == ["a.pdf"]
+    assert "Источник" not in parser.text
+    assert clean_html_code_block(parser.text) == "<p>Текст</p>"
+
+
+def test_tag_after_window():
+    head = "<p>" + "x" * (SOURCE_TAG_WINDOW + 100) + "</p>"
+    tokens, sources, parser = stream(pieces(head, 50) + [" [Источ", "ник: b.pdf", "] конец"])
+    # Источник сначала неизвестен, тег дальше в ответе вырезается и присылается вторым событием
+    assert sources == [None, "b.pdf"]
+    assert parser.text == head + "  конец"
+    assert parser.text == extract_source_and_clean_text(head + " [Источник: b.pdf] конец")[1]
+
+
+def test_bracket_that_is_not_a_tag():
+    head = "x" * (SOURCE_TAG_WINDOW + 1)
+    tokens, sources, parser = stream([head, " см. [", "1]", " и [Ист", "ория]"])
+    assert parser.text == head + " см. [1] и [История]"
+    assert sources == [None]
+
+
+def test_tag_without_source():
+    tokens, sources, parser = stream(["[Источник: без источника]", "<p>Текст</p>"])
+    assert sources == [None]
+    assert parser.text == "<p>Текст</p>"
@@ -0,0 +1,66 @@
+import itertools
+import pytest
+import translation_cache
+from translation_cache import TranslationCache
+
+MODEL = "kazRush"
+
+
+class Clock:
+    # last_used по порядку вызовов, а не по системным часам с их разрешением
+    def __init__(self):
+        self.ticks = itertools.count(1)
+
+    def time(self) -> float:
+        return float(next(self.ticks))
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(translation_cache, "time", Clock())
+    # Каждая запись ниже — 100 байт: влезают три, четвёртая вызывает вытеснение
+    return TranslationCache(str(tmp_path / "translation_cache.db"), max_bytes=350)
+
+
+def entry(name: str):
+    # (текст, перевод) на 100 байт
+    return name * 50, name.upper() * 50
+
+
+def stored_bytes(cache) -> int:
+    return cache.conn.execute("SELECT COALESCE(SUM(size), 0) FROM translations").fetchone()[0]
+
+
+def test_replacing_entry_keeps_total_bytes(cache):
+    text, translated = entry("a")
+    for _ in range(5):
+        cache.put(text, MODEL, translated)
+    cache.put(text, MODEL, translated * 2)
+    assert cache.total_bytes == stored_bytes(cache) == 150
+    assert cache.get(text, MODEL) == translated * 2
+
+
+def test_least_recently_used_entry_is_evicted(cache):
+    for name in "abc":
+        cache.put(entry(name)[0], MODEL, entry(name)[1])
+    cache.get(entry("a")[0], MODEL)  # a использован позже b и c
+    cache.put(entry("d")[0], MODEL, entry("d")[1])
+
+    found = cache.get_many([entry(name)[0] for name in "abcd"], MODEL)
+    assert set(found) == {entry(name)[0] for name in "acd"}
+    assert cache.total_bytes == stored_bytes(cache) == 300
+
+
+def test_hit_and_miss_counters(cache):
+    cache.put(entry("a")[0], MODEL, entry("a")[1])
+    # Повтор одного текста в запросе считается один раз; та же строка другой модели — промах
+    cache.get_many([entry("a")[0], entry("a")[0], entry("b")[0]], MODEL)
+    cache.get(entry("a")[0], "gpt-4o")
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 2)
+    assert stats["hit_rate"] == pytest.approx(1 / 3)
+
+
+def test_key_ignores_whitespace_differences(cache):
+    cache.put("Сәлем,   әлем\n", MODEL, "Привет, мир")
+    assert cache.get("Сәлем, әлем", MODEL) == "Привет, мир"
@@ -0,0 +1,74 @@
+# text_extraction.py
+# Извлечение текста и нарезка на чанки. Модуль не загружает модели,
+# поэтому его можно выполнять в пуле процессов build_index.py.
+import re
+import fitz  # PyMuPDF
+import docx
+from pathlib import Path
+
+
+def extract_text_from_pdf(path):
+    try:
+        doc = fitz.open(path)
+        return "\n".join([page.get_text() for page in doc])
+    except Exception as e:
+        print(f"⚠️ Не удалось прочитать PDF {path}: {e}")
+        return ""
+
+def extract_text_from_docx(path):
+    try:
+        doc = docx.Document(path)
+        return "\n".join([para.text for para in doc.paragraphs])
+    except Exception as e:
+        print(f"⚠️ Не удалось прочитать {path}: {e}")
+        return ""
+
+def extract_text_from_file(file: Path) -> str:
+    if file.suffix.lower() == ".pdf":
+        return extract_text_from_pdf(file)
+    elif file.suffix.lower() == ".docx":
+        return extract_text_from_docx(file)
+    else:
+        print(f"⚠️ Неподдерживаемый формат: {file.name}")
+        return ""
+
+def chunk_text_with_overlap(text: str, size=1000, overlap=200):
+    words = text.split()
+    chunks = []
+    start = 0
+    while start < len(words):
+        end = start + size
+        chunk = " ".join(words[start:end])
+        chunks.append(chunk.strip())
+        start += size - overlap
+    return chunks
+
+def split_sentences(text: str) -> list:
+    return [s.strip() for s in re.split(r"(?<=[.!?…])\s+", text) if s.strip()]
+
+def segment_text(text: str, max_chars=4000) -> list:
+    """
+    Сегменты для перевода: подряд идущие целые предложения суммарно до max_chars символов.
+    Слишком длинное предложение становится отдельным сегментом.
+    """
+    segments = []
+    current = []
+    length = 0
+    for sentence in split_sentences(text):
+        if current and length + len(sentence) > max_chars:
+            segments.append(" ".join(current))
+            current, length = [], 0
+        current.append(sentence)
+        length += len(sentence) + 1
+    if current:
+        segments.append(" ".join(current))
+    return segments
+
+def infer_date(text):
+    match = re.search(r"\d{1,2}\s+[а-яА-Я]+\s+20\d{2}", text)
+    return match.group(0) if match else None
+
+def extract_and_chunk(path: str, size=1000, overlap=200):
+    # Задача для пула процессов: путь на входе, текст и чанки на выходе
+    full_text = extract_text_from_file(Path(path))
+    return full_text, chunk_text_with_overlap(full_text, size=size, overlap=overlap)
@@ -1,35 +1,48 @@
 import json
+import os
 import faiss
 import numpy as np
 from pathlib import Path
-from sentence_transformers import SentenceTransformer
+from meta_store import META_DB_PATH, open_meta_store
+from embeddings import embedding_config, load_embedder, read_embedding_config, save_embedding_config
 
-META_PATH = "faiss_index/meta.json"
 INDEX_PATH = "faiss_index/title_index.faiss"
 TITLES_PATH = "faiss_index/title_list.json"
+TITLE_EMBEDDING_PATH = "faiss_index/title_embedding.json"
 EMBEDDING_MODEL = "paraphrase-multilingual-MiniLM-L12-v2"
+# Свои настройки: EMBEDDING_BACKEND и EMBEDDING_ONNX_FILE относятся к модели документов (mxbai)
+TITLE_EMBEDDING_BACKEND = os.getenv("TITLE_EMBEDDING_BACKEND", "torch")  # torch | int8 | onnx
+TITLE_EMBEDDING_ONNX_FILE = os.getenv("TITLE_EMBEDDING_ONNX_FILE", "onnx/model.onnx")
+EMBEDDING = embedding_config(f"sentence-transformers/{EMBEDDING_MODEL}", TITLE_EMBEDDING_BACKEND, 0)
 
 # === Загрузка модели и заголовков ===
-model = SentenceTransformer(EMBEDDING_MODEL)
+model = load_embedder(EMBEDDING, TITLE_EMBEDDING_ONNX_FILE)
 
 def load_titles_and_sources():
-    with open(META_PATH, "r", encoding="utf-8") as f:
-        metadata = json.load(f)
-    titles = [doc["title"] for doc in metadata]
-    sources = [doc["source"] for doc in metadata]
+    # Один заголовок на документ из хранилища метаданных
+    documents = list(open_meta_store(META_DB_PATH, readonly=True).iter_documents())
+    titles = [doc["title"] for doc in documents]
+    sources = [doc["source"] for doc in documents]
     return titles, sources
 
 # === Создание или загрузка индекса ===
 def build_or_load_index():
     titles, sources = load_titles_and_sources()
 
-    if Path(INDEX_PATH).exists() and Path(TITLES_PATH).exists():
+    # Индекс без сохранённых настроек или построенный с другими настройками модели пересоздаётся
+    same_embedding = Path(TITLE_EMBEDDING_PATH).exists() and read_embedding_config(TITLE_EMBEDDING_PATH) == EMBEDDING
+    if Path(INDEX_PATH).exists() and Path(TITLES_PATH).exists() and not same_embedding:
+        print("🔧 Индекс заголовков построен с другими настройками модели. Создаю заново...")
+    elif Path(INDEX_PATH).exists() and Path(TITLES_PATH).exists():
         index = faiss.read_index(INDEX_PATH)
         with open(TITLES_PATH, "r", encoding="utf-8") as f:
             loaded_titles = json.load(f)
-        return index, loaded_titles, sources
+        if index.ntotal == len(sources) == len(loaded_titles):
+            return index, loaded_titles, sources
+        print("🔧 Индекс заголовков устарел. Создаю заново...")
+    else:
+        print("🔧 Индекс не найден. Создаю заново...")
 
-    print("🔧 Индекс не найден. Создаю заново...")
     vectors = model.encode(titles)
     index = faiss.IndexFlatL2(vectors.shape[1])
     index.add(np.array(vectors))
@@ -38,6 +51,7 @@ def build_or_load_index():
     faiss.write_index(index, INDEX_PATH)
     with open(TITLES_PATH, "w", encoding="utf-8") as f:
         json.dump(titles, f, ensure_ascii=False, indent=2)
+    save_embedding_config(EMBEDDING, TITLE_EMBEDDING_PATH)
 
     return index, titles, sources
 
@@ -0,0 +1,141 @@
+# translation_cache.py
+# Кэш переводов на диске: SQLite, ключ — хэш нормализованного текста и модели.
+# Общий для build_index.py и API, переживает перезапуски; старые записи вытесняются по LRU.
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from pathlib import Path
+from dotenv import load_dotenv
+
+load_dotenv()
+
+TRANSLATION_CACHE_PATH = os.getenv("TRANSLATION_CACHE_PATH", "faiss_index/translation_cache.db")
+TRANSLATION_CACHE_MAX_MB = int(os.getenv("TRANSLATION_CACHE_MAX_MB", "512"))
+EVICT_TO = 0.9  # после вытеснения кэш занимает не больше 90% лимита
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS translations (
+    key TEXT PRIMARY KEY,              -- sha256(модель + нормализованный текст)
+    model TEXT NOT NULL,
+    translated TEXT NOT NULL,
+    size INTEGER NOT NULL,             -- байт исходного текста и перевода
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS translations_last_used ON translations(last_used);
+"""
+
+
+def normalize_text(text: str) -> str:
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+def cache_key(text: str, model: str) -> str:
+    return hashlib.sha256(f"{model}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+class TranslationCache:
+    def __init__(self, path: str = TRANSLATION_CACHE_PATH, max_bytes: int = TRANSLATION_CACHE_MAX_MB * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.conn.executescript(SCHEMA)
+        self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM translations").fetchone()[0]
+
+    @property
+    def conn(self):
+        # Отдельное соединение на поток: переводы идут из потоков llm_dispatcher
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode = WAL")  # build_index.py и API пишут одновременно
+            self._local.conn = conn
+        return conn
+
+    def get_many(self, texts: list, model: str) -> dict:
+        """
+        Возвращает {текст: перевод} для найденных в кэше текстов и обновляет их время использования.
+        """
+        keys = {cache_key(text, model): text for text in texts}
+        found = {}
+        if keys:
+            placeholders = ",".join("?" * len(keys))
+            rows = self.conn.execute(
+                f"SELECT key, translated FROM translations WHERE key IN ({placeholders})", list(keys)
+            ).fetchall()
+            for key, translated in rows:
+                found[keys[key]] = translated
+            if rows:
+                self.conn.execute(
+                    f"UPDATE translations SET last_used = ? WHERE key IN ({','.join('?' * len(rows))})",
+                    [time.time()] + [key for key, _ in rows]
+                )
+        with self.lock:
+            self.hits += len(found)
+            self.misses += len(set(texts)) - len(found)
+        return found
+
+    def get(self, text: str, model: str):
+        return self.get_many([text], model).get(text)
+
+    def put(self, text: str, model: str, translated: str):
+        key = cache_key(text, model)
+        size = len(text.encode("utf-8")) + len(translated.encode("utf-8"))
+        with self.lock:
+            # Запись может заменить старую с тем же ключом: её размер вычитается из счётчика
+            conn = self.conn
+            row = conn.execute("SELECT size FROM translations WHERE key = ?", (key,)).fetchone()
+            conn.execute(
+                "INSERT OR REPLACE INTO translations (key, model, translated, size, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, model, translated, size, time.time())
+            )
+            self.total_bytes += size - (row[0] if row else 0)
+            over_limit = self.total_bytes > self.max_bytes
+        if over_limit:
+            self.evict()
+
+    def evict(self):
+        # Удаляем давно не использованные записи, пока кэш не уложится в EVICT_TO от лимита
+        with self.lock:
+            conn = self.conn
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM translations").fetchone()[0]
+            target = self.max_bytes * EVICT_TO
+            if total > target:
+                freed = 0
+                stale = []
+                for key, size in conn.execute("SELECT key, size FROM translations ORDER BY last_used"):
+                    if total - freed <= target:
+                        break
+                    stale.append((key,))
+                    freed += size
+                conn.executemany("DELETE FROM translations WHERE key = ?", stale)
+                total -= freed
+                print(f"🧹 Кэш переводов: вытеснено {len(stale)} записей")
+            self.total_bytes = total
+
+    def stats(self) -> dict:
+        with self.lock:
+            requests = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / requests if requests else 0.0,
+                "size_mb": self.total_bytes / (1024 * 1024)
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_translation_cache() -> TranslationCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = TranslationCache()
+        return _cache
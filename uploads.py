@@ -0,0 +1,108 @@
+# uploads.py
+# Приём файлов запросов: загрузка и скачивание пишутся на диск частями,
+# размер ограничен, формат проверяется по заголовку и сигнатуре до чтения всего файла.
+import os
+from pathlib import Path
+import httpx
+from dotenv import load_dotenv
+from executors import run_io
+
+load_dotenv()
+
+MAX_UPLOAD_MB = int(os.getenv("MAX_UPLOAD_MB", "50"))
+MAX_UPLOAD_BYTES = MAX_UPLOAD_MB * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# Читатели PDF ищут %PDF- в первых 1024 байтах: перед ним бывает мусор от генераторов и почтовых шлюзов
+MAGIC_SEARCH_BYTES = 1024
+
+# Сигнатура файла каждого поддерживаемого формата: у pdf — в первых MAGIC_SEARCH_BYTES, у остальных — с нулевого байта
+MAGIC_BYTES = {
+    "pdf": b"%PDF-",
+    "docx": b"PK\x03\x04",                        # zip-контейнер Office Open XML
+    "doc": b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1",    # OLE2 (Word 97–2003)
+}
+CONTENT_TYPES = {
+    "pdf": {"application/pdf", "application/x-pdf"},
+    "docx": {"application/vnd.openxmlformats-officedocument.wordprocessingml.document", "application/zip"},
+    "doc": {"application/msword"},
+}
+GENERIC_CONTENT_TYPES = {"", "application/octet-stream", "binary/octet-stream"}
+
+
+class UploadError(Exception):
+    def __init__(self, message: str, status_code: int):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def check_content_type(ext: str, content_type) -> None:
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    if content_type not in GENERIC_CONTENT_TYPES and content_type not in CONTENT_TYPES[ext]:
+        raise UploadError(f"Тип содержимого {content_type} не соответствует формату .{ext}", 415)
+
+def check_magic(ext: str, head: bytes) -> None:
+    found = MAGIC_BYTES[ext] in head[:MAGIC_SEARCH_BYTES] if ext == "pdf" else head.startswith(MAGIC_BYTES[ext])
+    if not found:
+        raise UploadError(f"Содержимое файла не похоже на .{ext}", 415)
+
+def check_size(size: int) -> None:
+    if size > MAX_UPLOAD_BYTES:
+        raise UploadError(f"Файл больше {MAX_UPLOAD_MB} МБ", 413)
+
+
+async def write_chunks(chunks, path: Path, ext: str) -> int:
+    """
+    Пишет асинхронный поток байтов в файл; первые MAGIC_SEARCH_BYTES проверяются по сигнатуре
+    до записи, при превышении размера или ошибке недописанный файл удаляется.
+    """
+    size = 0
+    head = b""  # части скачивания бывают короче MAGIC_SEARCH_BYTES: копим до проверки
+    f = await run_io(open, path, "wb")
+    try:
+        async for chunk in chunks:
+            size += len(chunk)
+            check_size(size)
+            if head is not None:
+                head += chunk
+                if len(head) < MAGIC_SEARCH_BYTES:
+                    continue
+                check_magic(ext, head)
+                chunk, head = head, None
+            await run_io(f.write, chunk)
+        if size == 0:
+            raise UploadError("Пустой файл", 400)
+        if head is not None:
+            # Файл короче MAGIC_SEARCH_BYTES
+            check_magic(ext, head)
+            await run_io(f.write, head)
+    except BaseException:
+        await run_io(f.close)
+        path.unlink(missing_ok=True)
+        raise
+    await run_io(f.close)
+    return size
+
+async def save_upload(file, path: Path, ext: str) -> int:
+    # UploadFile уже лежит во временном файле Starlette: копируем частями, не читая целиком в память
+    check_content_type(ext, file.content_type)
+    if file.size is not None:
+        check_size(file.size)
+
+    async def chunks():
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            yield chunk
+
+    return await write_chunks(chunks(), path, ext)
+
+async def download_to_file(client, url: str, path: Path, ext: str = "pdf") -> int:
+    # client — executors.create_http_client(): перенаправления проходятся, их число ограничено
+    try:
+        async with client.stream("GET", url) as response:
+            if response.status_code != 200:
+                raise UploadError("Не удалось скачать PDF", 502)
+            # Заголовок Content-Type у внешних серверов ненадёжен — формат проверяется по сигнатуре
+            if response.headers.get("content-length", "").isdigit():
+                check_size(int(response.headers["content-length"]))
+            return await write_chunks(response.aiter_bytes(UPLOAD_CHUNK_SIZE), path, ext)
+    except httpx.TooManyRedirects:
+        raise UploadError("Слишком много перенаправлений при скачивании PDF", 502)
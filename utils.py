@@ -1,70 +1,160 @@
 from docx import Document
 from docx.shared import Inches
-from reportlab.platypus import SimpleDocTemplate, ListFlowable, ListItem, Paragraph, Spacer, Image
+from reportlab.platypus import SimpleDocTemplate, ListFlowable, ListItem, Paragraph, Spacer, Flowable
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.pdfbase import pdfmetrics
+from reportlab.lib.utils import ImageReader
+from reportlab import rl_config
+from PIL import Image as PILImage
 from pathlib import Path
 from bs4 import BeautifulSoup
 # from xhtml2pdf import pisa
 import datetime
+import os
+import uuid
+from io import BytesIO
+
+FONT_PATH = "fonts/DejaVuSans.ttf"
+HEADER_PDF_PATH = "assets/header_pdf.png"
+HEADER_HEIGHT = 150
+HEADER_PX_PER_PT = 2  # разрешение предмасштабированной шапки: пикселей на пункт PDF
+
+# Потоки PDF пишутся в двоичном виде: без rl_accel кодирование ASCII85 на чистом Python
+# занимало большую часть времени сборки документа (в основном данные шапки).
+# Настройка общая для всего reportlab в процессе, поэтому задаётся здесь, при импорте, а не в рендерере
+rl_config.useA85 = 0
+
+
+def prepare_header(header_path: str, size) -> PILImage.Image:
+    # Шапка декодируется один раз, прозрачность заливается белым,
+    # изображение уменьшается до размера вывода — в каждый PDF встраивается уже готовое
+    image = PILImage.open(header_path)
+    if image.mode in ("RGBA", "LA", "P"):
+        image = image.convert("RGBA")
+        background = PILImage.new("RGB", image.size, "white")
+        background.paste(image, mask=image.split()[-1])
+        image = background
+    else:
+        image = image.convert("RGB")
+    target = (int(size[0] * HEADER_PX_PER_PT), int(size[1] * HEADER_PX_PER_PT))
+    if image.width > target[0] or image.height > target[1]:
+        image = image.resize(target, PILImage.LANCZOS)
+    return image
+
+
+class HeaderImage(Flowable):
+    # Шапка из общего ImageReader: изображение не читается и не декодируется заново для каждого PDF
+    def __init__(self, reader: ImageReader, width: float, height: float):
+        super().__init__()
+        self.reader = reader
+        self.width = width
+        self.height = height
+        self.hAlign = "CENTER"
+
+    def wrap(self, availWidth, availHeight):
+        return self.width, self.height
+
+    def draw(self):
+        self.canv.drawImage(self.reader, 0, 0, self.width, self.height)
+
+
+class PdfRenderer:
+    """
+    Шрифт, стили и шапка готовятся один раз на процесс; render строит PDF из HTML
+    в файл или в буфер (BytesIO).
+    """
+
+    def __init__(self, font_path: str = FONT_PATH, header_path: str = HEADER_PDF_PATH):
+        pdfmetrics.registerFont(TTFont("DejaVuSans", font_path))
+
+        self.styles = getSampleStyleSheet()
+        self.styles.add(ParagraphStyle(name='KazakhText', fontName='DejaVuSans', fontSize=11, leading=16))
+
+        width, _ = A4
+        self.header_size = (width - 90, HEADER_HEIGHT)
+        self.header = ImageReader(prepare_header(header_path, self.header_size))
+
+    def build_elements(self, html_string: str) -> list:
+        elements = []
+
+        # Картинка
+        elements.append(HeaderImage(self.header, *self.header_size))
+        elements.append(Spacer(1, 12))
+
+        # Обработка HTML
+        cleaned_text = html_string.replace("<br>", "\n").replace("<br/>", "\n").replace("<br />", "\n")
+        soup = BeautifulSoup(cleaned_text, "html.parser")
+
+        for tag in soup.children:
+            if tag.name == "p":
+                text = tag.get_text(strip=True)
+                if text:
+                    elements.append(Paragraph(text, self.styles['KazakhText']))
+                    elements.append(Spacer(1, 8))
+            elif tag.name in ["ol", "ul"]:
+                items = []
+                for li in tag.find_all("li"):
+                    li_text = li.get_text(strip=True)
+                    if li_text:
+                        items.append(ListItem(Paragraph(li_text, self.styles['KazakhText'])))
+                if items:
+                    elements.append(ListFlowable(items, bulletType='1' if tag.name == "ol" else 'bullet'))
+                    elements.append(Spacer(1, 8))
+        return elements
+
+    def render(self, html_string: str, output):
+        """
+        output — путь к файлу или объект с write (например, BytesIO).
+        """
+        doc = SimpleDocTemplate(output, pagesize=A4,
+                                leftMargin=50, rightMargin=40, topMargin=30, bottomMargin=50)
+        doc.build(self.build_elements(html_string))
+        return output
+
+
+_pdf_renderer = None
+
+def get_pdf_renderer():
+    # Один рендерер на процесс (в т. ч. на каждый процесс пула рендеринга API)
+    global _pdf_renderer
+    if _pdf_renderer is None:
+        if not Path(HEADER_PDF_PATH).exists():
+            print(f"❌ Картинка не найдена: {HEADER_PDF_PATH}")
+            return None
+        if not Path(FONT_PATH).exists():
+            print(f"❌ Шрифт не найден: {FONT_PATH}")
+            return None
+        _pdf_renderer = PdfRenderer()
+    return _pdf_renderer
+
+def write_atomically(output_name: str, write):
+    """
+    write(путь) пишет во временный файл рядом с output_name, который затем переименовывается.
+    render_jobs считает файл в answers/ готовым, если он существует: упавший рендер или тот же
+    документ, который строит другой воркер, не должны оставить под этим именем недописанный файл.
+    """
+    tmp_name = f"{output_name}.{uuid.uuid4().hex}.tmp"
+    try:
+        write(tmp_name)
+        os.replace(tmp_name, output_name)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
 
 def save_html_to_pdf(html_string: str, filename: str = None):
-    font_path = "fonts/DejaVuSans.ttf"
-    header_path = "assets/header_pdf.png"
-
-    if not Path(header_path).exists():
-        print(f"❌ Картинка не найдена: {header_path}")
-        return
-    if not Path(font_path).exists():
-        print(f"❌ Шрифт не найден: {font_path}")
+    renderer = get_pdf_renderer()
+    if renderer is None:
         return
 
-    pdfmetrics.registerFont(TTFont("DejaVuSans", font_path))
-
     Path("answers").mkdir(parents=True, exist_ok=True)
     timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
     output_name = f"answers/{filename or f'report_{timestamp}.pdf'}"
 
-    doc = SimpleDocTemplate(output_name, pagesize=A4,
-                            leftMargin=50, rightMargin=40, topMargin=30, bottomMargin=50)
-
-    styles = getSampleStyleSheet()
-    styles.add(ParagraphStyle(name='KazakhText', fontName='DejaVuSans', fontSize=11, leading=16))
-
-    elements = []
-
-    # Картинка
-    width, _ = A4
-    img = Image(header_path, width=width - 90, height=150)
-    elements.append(img)
-    elements.append(Spacer(1, 12))
-
-    # Обработка HTML
-    cleaned_text = html_string.replace("<br>", "\n").replace("<br/>", "\n").replace("<br />", "\n")
-    soup = BeautifulSoup(cleaned_text, "html.parser")
-
-    for tag in soup.children:
-        if tag.name == "p":
-            text = tag.get_text(strip=True)
-            if text:
-                elements.append(Paragraph(text, styles['KazakhText']))
-                elements.append(Spacer(1, 8))
-        elif tag.name in ["ol", "ul"]:
-            items = []
-            for li in tag.find_all("li"):
-                li_text = li.get_text(strip=True)
-                if li_text:
-                    items.append(ListItem(Paragraph(li_text, styles['KazakhText'])))
-            if items:
-                elements.append(ListFlowable(items, bulletType='1' if tag.name == "ol" else 'bullet'))
-                elements.append(Spacer(1, 8))
-
-    doc.build(elements)
+    write_atomically(output_name, lambda path: renderer.render(html_string, path))
     print(f"✅ PDF сохранён: {output_name}")
 
-
 # def save_to_pdf(text: str, filename: str = None):
 #     font_path = "fonts/DejaVuSans.ttf"
 #     header_path = "assets/header_pdf.png"  # ⚠️ путь к картинке
@@ -113,12 +203,8 @@ def save_html_to_pdf(html_string: str, filename: str = None):
 #     doc.build(elements)
 #     print(f"\n📄 PDF успешно создан с шапкой: {output_name}")
 
-def save_to_docx(text: str, filename: str = None):
+def build_docx(text: str):
     header_path = "assets/header_docx.png"  # отдельное изображение (можно то же)
-    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-    Path("answers").mkdir(parents=True, exist_ok=True)
-    output_name = f"answers/{filename or f'generated_answer_{timestamp}.docx'}"
-
     doc = Document()
 
     # === Добавляем шапку-картинку ===
@@ -132,6 +218,24 @@ def save_to_docx(text: str, filename: str = None):
             doc.add_paragraph(paragraph.strip())
         else:
             doc.add_paragraph("")
+    return doc
+
+def save_to_docx(text: str, filename: str = None):
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    Path("answers").mkdir(parents=True, exist_ok=True)
+    output_name = f"answers/{filename or f'generated_answer_{timestamp}.docx'}"
+
+    write_atomically(output_name, build_docx(text).save)
+    print(f"📝 DOCX успешно сохранён: {output_name}")
+
+# === Рендеринг в память: без записи в answers/ ===
+def render_pdf_bytes(html_string: str) -> bytes:
+    renderer = get_pdf_renderer()
+    if renderer is None:
+        raise RuntimeError("Не найден шрифт или шапка для PDF")
+    return renderer.render(html_string, BytesIO()).getvalue()
 
-    doc.save(output_name)
-    print(f"📝 DOCX успешно сохранён: {output_name}")
\ No newline at end of file
+def render_docx_bytes(text: str) -> bytes:
+    buffer = BytesIO()
+    build_docx(text).save(buffer)
+    return buffer.getvalue()
@@ -0,0 +1,215 @@
+# vector_index.py
+import os
+import faiss
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# === Настройки индекса ===
+# flat — точный перебор; ivf_flat, hnsw, ivf_pq, opq_ivf_pq — приближённый поиск
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw", "ivf_pq", "opq_ivf_pq")
+INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "flat")
+# l2 — евклидово расстояние; ip — скалярное произведение нормированных векторов (косинус)
+METRIC = os.getenv("FAISS_METRIC", "l2")
+# fp32 — без сжатия; fp16 и int8 — скалярное квантование (в 2 и 4 раза меньше памяти)
+STORAGE = os.getenv("FAISS_STORAGE", "fp32")
+NLIST = int(os.getenv("FAISS_NLIST", "1024"))       # число кластеров IVF
+PQ_M = int(os.getenv("FAISS_PQ_M", "64"))           # число подвекторов PQ (делитель размерности)
+HNSW_M = int(os.getenv("FAISS_HNSW_M", "32"))       # число связей в графе HNSW
+NPROBE = int(os.getenv("FAISS_NPROBE", "16"))       # сколько кластеров IVF просматривать при поиске
+EF_SEARCH = int(os.getenv("FAISS_EF_SEARCH", "64")) # ширина поиска HNSW
+
+METRICS = {"l2": faiss.METRIC_L2, "ip": faiss.METRIC_INNER_PRODUCT}
+STORAGE_CODES = {"fp32": "Flat", "fp16": "SQfp16", "int8": "SQ8"}
+
+# Рекомендация faiss: не меньше 39 обучающих векторов на кластер, 256 — на кодовую книгу PQ
+MIN_POINTS_PER_CENTROID = 39
+PQ_CENTROIDS = 256
+# Во сколько раз корпус может перерасти число кластеров, выбранное при первой сборке, до предупреждения
+NLIST_GROWTH_WARNING = 4
+
+
+def factory_string(dim: int, index_type: str = INDEX_TYPE, n_train: int = None, storage: str = STORAGE) -> str:
+    """
+    Строка для faiss.index_factory. Если векторов для обучения мало,
+    число кластеров уменьшается, а PQ заменяется на хранение без PQ-сжатия.
+    Для PQ-индексов storage не применяется: векторы и так сжаты.
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Неизвестный тип индекса: {index_type}, допустимые: {', '.join(INDEX_TYPES)}")
+    if storage not in STORAGE_CODES:
+        raise ValueError(f"Неизвестный формат хранения: {storage}, допустимые: {', '.join(STORAGE_CODES)}")
+    code = STORAGE_CODES[storage]
+
+    nlist = NLIST
+    if n_train is not None:
+        nlist = max(1, min(NLIST, n_train // MIN_POINTS_PER_CENTROID))
+
+    if index_type in ("ivf_pq", "opq_ivf_pq"):
+        if dim % PQ_M != 0:
+            raise ValueError(f"FAISS_PQ_M={PQ_M} должно делить размерность {dim}")
+        if n_train is not None and n_train < PQ_CENTROIDS:
+            print(f"⚠️ Мало векторов для обучения PQ ({n_train}), используется ivf_flat.")
+            index_type = "ivf_flat"
+
+    if index_type == "flat":
+        return code
+    if index_type == "ivf_flat":
+        return f"IVF{nlist},{code}"
+    if index_type == "hnsw":
+        return f"HNSW{HNSW_M},{code}"
+    if index_type == "ivf_pq":
+        return f"IVF{nlist},PQ{PQ_M}"
+    return f"OPQ{PQ_M},IVF{nlist},PQ{PQ_M}"
+
+
+def create_index(dim: int, index_type: str = INDEX_TYPE, n_train: int = None,
+                 metric: str = METRIC, storage: str = STORAGE):
+    """
+    Индекс с внешними id (id чанка или документа в meta_store): IVF хранит id сам,
+    остальные типы оборачиваются в IDMap2.
+    """
+    if metric not in METRICS:
+        raise ValueError(f"Неизвестная метрика: {metric}, допустимые: {', '.join(METRICS)}")
+    description = factory_string(dim, index_type, n_train, storage)
+    if not description.startswith(("IVF", "OPQ")):
+        description = f"IDMap2,{description}"
+    return faiss.index_factory(dim, description, METRICS[metric])
+
+
+def get_ivf(index):
+    try:
+        return faiss.extract_index_ivf(index)
+    except RuntimeError:
+        return None  # не IVF-индекс
+
+
+def is_id_mapped(index) -> bool:
+    return isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)) or get_ivf(index) is not None
+
+
+def prepare_vectors(index, vectors):
+    """
+    Приводит векторы к float32 и, если индекс на скалярном произведении, нормирует их.
+    Нормировка определяется метрикой самого индекса, поэтому старые L2-индексы работают как раньше.
+    """
+    vectors = np.array(vectors, dtype="float32", order="C")
+    if index.metric_type == faiss.METRIC_INNER_PRODUCT and len(vectors):
+        faiss.normalize_L2(vectors)
+    return vectors
+
+
+def search_index(index, query_vectors, top_k: int):
+    return index.search(prepare_vectors(index, query_vectors), top_k)
+
+
+def configure_search(index, nprobe: int = NPROBE, ef_search: int = EF_SEARCH):
+    """
+    Параметры поиска выставляются при каждой загрузке: в файл индекса они не сохраняются.
+    """
+    params = faiss.ParameterSpace()
+    for name, value in (("nprobe", nprobe), ("efSearch", ef_search)):
+        try:
+            params.set_index_parameter(index, name, value)
+        except RuntimeError:
+            pass  # параметр не относится к этому типу индекса
+    return index
+
+
+def train_and_add(index, vectors, ids):
+    vectors = prepare_vectors(index, vectors)
+    if len(vectors) == 0:
+        return index
+    if not index.is_trained:
+        print(f"🧠 Обучение индекса на {len(vectors)} векторах...")
+        index.train(vectors)
+    index.add_with_ids(vectors, np.asarray(ids, dtype="int64"))
+    return index
+
+
+def check_nlist(index, name: str = "индекс"):
+    """
+    nlist выбирается один раз по размеру первой сборки, дописанные векторы попадают в те же кластеры.
+    Когда корпус перерос его, списки становятся длинными, поиск медленнее и хуже — нужна пересборка.
+    """
+    ivf = get_ivf(index)
+    if ivf is None:
+        return
+    expected = min(NLIST, index.ntotal // MIN_POINTS_PER_CENTROID)
+    if expected >= NLIST_GROWTH_WARNING * ivf.nlist:
+        print(f"⚠️ {name}: {index.ntotal} векторов на {ivf.nlist} кластерах IVF (для такого размера — {expected}). "
+              f"Пересоберите индекс: python migrate_index.py")
+
+
+def build_index_from_vectors(vectors, ids=None, index_type: str = INDEX_TYPE,
+                             metric: str = METRIC, storage: str = STORAGE):
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    if ids is None:
+        ids = np.arange(len(vectors))
+    index = create_index(vectors.shape[1], index_type, len(vectors), metric, storage)
+    return configure_search(train_and_add(index, vectors, ids))
+
+
+def read_index(path: str):
+    return configure_search(faiss.read_index(path))
+
+
+def extract_vectors(index):
+    """
+    Возвращает (ids, векторы). Для PQ и SQ8 это приближённая реконструкция,
+    для ip-индексов — уже нормированные векторы.
+    """
+    if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        ids = faiss.vector_to_array(index.id_map).copy()
+        return ids, index.index.reconstruct_n(0, index.ntotal)
+
+    ivf = get_ivf(index)
+    if ivf is None:
+        # Индекс без id: id совпадает с номером строки
+        return np.arange(index.ntotal), index.reconstruct_n(0, index.ntotal)
+
+    invlists = ivf.invlists
+    ids = [faiss.rev_swig_ptr(invlists.get_ids(l), invlists.list_size(l)).copy()
+           for l in range(invlists.nlist) if invlists.list_size(l)]
+    ids = np.concatenate(ids) if ids else np.array([], dtype="int64")
+    ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+    return ids, index.reconstruct_batch(ids)
+
+
+def ensure_id_map(index):
+    """
+    Старые индексы без id (строка = id) переносятся в IDMap2, чтобы из них можно было удалять.
+    """
+    if is_id_mapped(index):
+        return index
+    print(f"🔧 Перевод индекса {type(index).__name__} на внешние id...")
+    ids, vectors = extract_vectors(index)
+    sub_index = faiss.clone_index(index)
+    sub_index.reset()
+    id_mapped = faiss.IndexIDMap2(sub_index)
+    id_mapped.add_with_ids(vectors, ids)
+    return configure_search(id_mapped)
+
+
+def remove_ids(index, ids):
+    """
+    Удаляет векторы по id. HNSW не поддерживает удаление,
+    поэтому такой индекс пересобирается из оставшихся векторов.
+    """
+    ids = np.asarray(list(ids), dtype="int64")
+    if len(ids) == 0 or index.ntotal == 0:
+        return index
+    try:
+        index.remove_ids(ids)
+        return index
+    except RuntimeError:
+        pass
+
+    print(f"🔧 {type(index).__name__} не поддерживает удаление, индекс пересобирается...")
+    all_ids, vectors = extract_vectors(index)
+    keep = ~np.isin(all_ids, ids)
+    rebuilt = faiss.clone_index(index)
+    rebuilt.reset()
+    rebuilt.add_with_ids(np.ascontiguousarray(vectors[keep]), all_ids[keep])
+    return configure_search(rebuilt)